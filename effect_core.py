@@ -0,0 +1,1425 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+序列帧特效预览器的公共部分
+扫描、监视、预览缓存、帧解码和特效筛选等与界面无关的代码，完整版和简化版共用
+"""
+
+import os
+import platform
+import re
+import bisect
+import json
+import sqlite3
+import ctypes
+import ctypes.util
+import errno
+import select
+import struct
+import collections
+import csv
+import hashlib
+import mmap
+import zlib
+import array
+import tempfile
+import itertools
+from PIL import Image, ImageTk
+import threading
+import time
+
+class ScanCatalog:
+    """
+    持久化的扫描索引（SQLite），按根目录保存每个目录的修改时间、子目录、
+    排好序的序列帧列表和文件大小。包含序列帧的目录即为特效，
+    名称、相对路径和帧数都可以从目录记录中得到。
+    每次操作单独打开连接，可以在扫描线程和界面线程中使用
+    """
+    
+    def __init__(self, db_path):
+        self.db_path = db_path
+    
+    def _connect(self):
+        """打开数据库连接，需要时创建表"""
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute("""CREATE TABLE IF NOT EXISTS directories (
+                            root TEXT NOT NULL,
+                            rel_path TEXT NOT NULL,
+                            mtime REAL NOT NULL,
+                            subdirs TEXT NOT NULL,
+                            frames TEXT NOT NULL,
+                            size INTEGER,
+                            PRIMARY KEY (root, rel_path))""")
+        return conn
+    
+    def _root_key(self, root):
+        """规范化根目录路径作为索引键"""
+        return os.path.normcase(os.path.abspath(root))
+    
+    def load(self, root):
+        """读取根目录下的所有目录节点，返回 {相对路径: 节点}"""
+        nodes = {}
+        try:
+            conn = self._connect()
+            try:
+                rows = conn.execute("SELECT rel_path, mtime, subdirs, frames, size FROM directories WHERE root = ?",
+                                    (self._root_key(root),))
+                for rel_path, mtime, subdirs, frames, size in rows:
+                    nodes[rel_path] = {
+                        'mtime': mtime,
+                        'subdirs': json.loads(subdirs),
+                        'frames': json.loads(frames),
+                        'size': size
+                    }
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError, ValueError) as e:
+            print(f"读取扫描索引失败: {e}")
+            return {}
+        return nodes
+    
+    def save(self, root, nodes, removed=()):
+        """写入变化的目录节点，并删除已不存在的子目录记录"""
+        root_key = self._root_key(root)
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    for rel_path in removed:
+                        # 按前缀比较子目录，LIKE的通配符（%和_）在目录名中很常见
+                        prefix = rel_path + os.sep
+                        conn.execute("DELETE FROM directories WHERE root = ? "
+                                     "AND (rel_path = ? OR substr(rel_path, 1, ?) = ?)",
+                                     (root_key, rel_path, len(prefix), prefix))
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO directories (root, rel_path, mtime, subdirs, frames, size) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        [(root_key, rel_path, node['mtime'], json.dumps(node['subdirs']),
+                          json.dumps(node['frames']), node['size'])
+                         for rel_path, node in nodes.items()]
+                    )
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError) as e:
+            print(f"保存扫描索引失败: {e}")
+    
+    def update_size(self, root, rel_path, size):
+        """更新单个目录的文件大小"""
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("UPDATE directories SET size = ? WHERE root = ? AND rel_path = ?",
+                                 (size, self._root_key(root), rel_path))
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError) as e:
+            print(f"保存扫描索引失败: {e}")
+
+class DirectoryWatcher:
+    """
+    监视目录内条目的增加、删除和重命名，把发生变化的目录路径放入队列
+    Linux上使用inotify，其他平台或inotify不可用时定期比较目录的修改时间
+    """
+    
+    # inotify事件掩码
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    WATCH_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+    
+    def __init__(self, directories, changes, poll_interval=2.0):
+        self.changes = changes  # 发生变化的目录路径队列
+        self.poll_interval = poll_interval
+        self.mtimes = dict(directories)  # 目录路径 -> 修改时间
+        self.watches = {}  # inotify watch描述符 -> 目录路径
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.libc = None
+        self.inotify_fd = None
+        self.thread = None
+    
+    @property
+    def backend(self):
+        return "inotify" if self.inotify_fd is not None else "轮询"
+    
+    def start(self):
+        """启动监视线程"""
+        if platform.system() == "Linux":
+            self._init_inotify()
+        
+        target = self._run_inotify if self.inotify_fd is not None else self._run_polling
+        self.thread = threading.Thread(target=target)
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def stop(self):
+        """停止监视，线程会在下一次检查时退出"""
+        self.stop_event.set()
+    
+    def add_directory(self, path, mtime):
+        """开始监视新出现的目录"""
+        with self.lock:
+            self.mtimes[path] = mtime
+        if self.inotify_fd is not None:
+            try:
+                self._add_watch(path)
+            except OSError as e:
+                print(f"监视目录失败 {path}: {e}")
+    
+    def remove_directory(self, path):
+        """停止监视目录（inotify会在目录删除时自动移除监视）"""
+        with self.lock:
+            self.mtimes.pop(path, None)
+    
+    def _init_inotify(self):
+        """初始化inotify并监视所有目录，失败时退回轮询"""
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+            self.inotify_fd = fd
+            for path in list(self.mtimes):
+                self._add_watch(path)
+        except (OSError, AttributeError) as e:
+            print(f"inotify不可用，改用轮询监视: {e}")
+            if self.inotify_fd is not None:
+                os.close(self.inotify_fd)
+                self.inotify_fd = None
+    
+    def _add_watch(self, path):
+        """为目录添加inotify监视，监视数量达到系统上限时抛出OSError"""
+        wd = self.libc.inotify_add_watch(self.inotify_fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                raise OSError(error, "inotify监视数量达到系统上限")
+            return  # 目录已被删除等情况，忽略
+        with self.lock:
+            self.watches[wd] = path
+    
+    def _run_inotify(self):
+        """读取inotify事件，合并成发生变化的目录"""
+        fd = self.inotify_fd
+        try:
+            while not self.stop_event.is_set():
+                ready, _, _ = select.select([fd], [], [], 0.5)
+                if not ready:
+                    continue
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                
+                changed = set()
+                offset = 0
+                while offset + 16 <= len(data):
+                    wd, mask, cookie, length = struct.unpack_from("iIII", data, offset)
+                    offset += 16 + length
+                    if mask & self.IN_Q_OVERFLOW:
+                        # 事件队列溢出，无法知道具体哪些目录变化了
+                        with self.lock:
+                            changed.update(self.watches.values())
+                        continue
+                    with self.lock:
+                        if mask & self.IN_IGNORED:
+                            self.watches.pop(wd, None)
+                            continue
+                        path = self.watches.get(wd)
+                    if path is not None:
+                        changed.add(path)
+                
+                for path in changed:
+                    self.changes.put(path)
+        except OSError as e:
+            print(f"目录监视出错: {e}")
+        finally:
+            os.close(fd)
+    
+    def _run_polling(self):
+        """定期比较目录修改时间"""
+        while not self.stop_event.wait(self.poll_interval):
+            with self.lock:
+                items = list(self.mtimes.items())
+            for path, mtime in items:
+                if self.stop_event.is_set():
+                    return
+                try:
+                    current = os.stat(path).st_mtime
+                except OSError:
+                    current = None
+                if current != mtime:
+                    with self.lock:
+                        if path in self.mtimes:
+                            self.mtimes[path] = current
+                    self.changes.put(path)
+
+class ScanJob:
+    """
+    一次扫描任务：包含取消标记和时间预算
+    任务被取消或超时后，尚未扫描的目录保存在pending中，可以从这里继续扫描
+    """
+    
+    def __init__(self, base_dir, max_depth, time_budget=0):
+        self.base_dir = base_dir
+        self.max_depth = max_depth
+        self.time_budget = time_budget  # 秒，0表示不限制
+        self.cancel_event = threading.Event()
+        self.deadline = None
+        self.status = 'running'
+        self.scanned = 0  # 已处理的文件夹数
+        self.nodes = {}  # 已读取的目录节点
+        self.pending = []  # 尚未扫描的目录 (父目录相对路径, 目录名, 深度, 是否分发子目录)
+        self.preloaded = False  # 是否先显示了扫描索引中的结果
+        self.pool = None  # 正在扫描的目录线程池，关闭程序时取消其中排队的目录
+        self.cached_effects = []
+    
+    def start_clock(self):
+        """开始计时"""
+        self.deadline = time.monotonic() + self.time_budget if self.time_budget else None
+    
+    def remaining_time(self):
+        """剩余时间（秒），不限制时返回None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+    
+    def cancel(self):
+        self.cancel_event.set()
+    
+    def resume(self):
+        """清除取消标记以便继续扫描"""
+        self.cancel_event.clear()
+        self.status = 'running'
+    
+    def should_stop(self):
+        """是否应当停止扫描（被取消或超出时间预算）"""
+        if self.cancel_event.is_set():
+            return True
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+class FrameCache:
+    """
+    缩放后序列帧的内存缓存，键为(文件路径, 修改时间, 目标尺寸)
+    按图像像素数据实际占用的字节数统计内存，超过上限时淘汰最久未使用的帧
+    可以在解码线程和界面线程中同时使用
+    """
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()  # 键 -> (图像, 字节数)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def image_bytes(img):
+        """计算PIL图像像素数据占用的字节数（多通道模式在内存中按每像素4字节存储）"""
+        if img.mode in ("1", "L", "P"):
+            pixel_size = 1
+        elif img.mode.startswith("I;16"):
+            pixel_size = 2
+        else:
+            pixel_size = 4
+        size = img.width * img.height * pixel_size
+        if img.mode == "P":
+            size += 1024  # 调色板
+        return size
+    
+    def get(self, key):
+        """读取缓存，命中时把该帧移到最近使用的位置"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, img):
+        """加入缓存，超过上限时淘汰最久未使用的帧"""
+        size = self.image_bytes(img)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self.entries[key] = (img, size)
+            self.current_bytes += size
+            self._evict()
+    
+    def set_max_bytes(self, max_bytes):
+        """修改内存上限"""
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+    
+    def _evict(self):
+        # 调用时需持有lock
+        while self.current_bytes > self.max_bytes and self.entries:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.current_bytes -= size
+    
+    def stats(self):
+        """返回缓存统计信息"""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'frames': len(self.entries)
+            }
+
+class PreviewContainer:
+    """
+    读取单个特效的预览容器文件
+    文件结构：魔数 + 各帧像素数据 + JSON索引 + 索引长度 + 魔数
+    文件通过mmap映射到内存，未压缩的帧不需要解压，只从映射区域复制一次
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.lock = threading.Lock()
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.map)
+            index = self._read_index()
+        except Exception:
+            self.close()
+            raise
+        self.entries = {entry['name']: entry for entry in index['frames']}  # 帧文件名 -> 索引项
+        self.files = index.get('files')  # 完整保存时的有序帧文件列表
+        self.folder_mtime_ns = index.get('folder_mtime_ns')  # 保存时特效文件夹的修改时间
+    
+    def _read_index(self):
+        magic = PreviewCache.MAGIC
+        trailer_size = struct.calcsize("<Q") + len(magic)
+        file_size = len(self.map)
+        if file_size < len(magic) + trailer_size or self.map[:len(magic)] != magic:
+            raise ValueError("预览容器格式错误")
+        if self.map[file_size - len(magic):] != magic:
+            raise ValueError("预览容器不完整")
+        index_size = struct.unpack_from("<Q", self.map, file_size - trailer_size)[0]
+        index_start = file_size - trailer_size - index_size
+        return json.loads(self.map[index_start:file_size - trailer_size].decode("utf-8"))
+    
+    def lookup(self, name, signature):
+        """源文件的(修改时间, 大小)没有变化时返回索引项"""
+        entry = self.entries.get(name)
+        if entry is None or (entry['mtime_ns'], entry['size']) != signature:
+            return None
+        return entry
+    
+    def read_blob(self, entry):
+        """返回一帧数据在映射区域中的切片"""
+        with self.lock:
+            if self.view is None:
+                raise ValueError("预览容器已关闭")
+            return self.view[entry['offset']:entry['offset'] + entry['length']]
+    
+    def read_image(self, entry):
+        """读取一帧并还原为PIL图像"""
+        size = (entry['width'], entry['height'])
+        with self.read_blob(entry) as blob:
+            if entry.get('codec', 'zlib') == 'raw':
+                # 未压缩的帧复制出映射区域，帧缓存中的图像不能引用映射，
+                # 否则映射无法关闭，Windows上提交或淘汰时替换、删除文件会失败
+                return Image.frombytes(entry['mode'], size, blob)
+            return Image.frombytes(entry['mode'], size, zlib.decompress(blob))
+    
+    def close(self):
+        with self.lock:
+            view, self.view = getattr(self, 'view', None), None
+            mapping, self.map = getattr(self, 'map', None), None
+            if view is not None:
+                view.release()
+            if mapping is not None:
+                try:
+                    mapping.close()
+                except BufferError:
+                    pass  # 其他线程正在读取的帧仍引用映射区域，映射会在读取结束后自动关闭
+            self.file.close()
+
+class PreviewWriter:
+    """
+    写入单个特效的预览容器文件，可以在多个解码线程中同时添加帧
+    先写入临时文件，提交时追加索引后替换正式文件
+    """
+    
+    def __init__(self, path, codec="zlib"):
+        self.path = path
+        self.codec = codec  # 新写入帧的存储方式：zlib压缩或raw未压缩
+        # 每个写入器使用自己唯一的临时文件，同一特效的多个写入器不会写进同一个文件
+        directory, name = os.path.split(path)
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, prefix=name + ".", suffix=".tmp")
+        self.file = os.fdopen(fd, "wb")
+        self.file.write(PreviewCache.MAGIC)
+        self.entries = {}  # 帧文件名 -> 索引项
+        self.lock = threading.Lock()
+    
+    def add_image(self, name, signature, img):
+        """写入一帧，未压缩的帧统一保存为RGBA，读取时不需要转换"""
+        if self.codec == "raw":
+            if img.mode != "RGBA":
+                img = img.convert("RGBA")
+        elif img.mode not in ("RGBA", "RGB", "LA", "L"):
+            img = img.convert("RGBA")
+        entry = {
+            'name': name,
+            'mtime_ns': signature[0],
+            'size': signature[1],
+            'mode': img.mode,
+            'width': img.width,
+            'height': img.height,
+            'codec': self.codec
+        }
+        data = img.tobytes()
+        self.add_blob(entry, data if self.codec == "raw" else zlib.compress(data, 1))
+    
+    def add_blob(self, entry, blob):
+        """写入一帧已经编码好的数据"""
+        with self.lock:
+            if self.file.closed:
+                return
+            entry = dict(entry, offset=self.file.tell(), length=len(blob))
+            self.file.write(blob)
+            self.entries[entry['name']] = entry
+    
+    def commit(self, source, files=None, folder_mtime_ns=None):
+        """写入索引并替换正式文件，files为完整的有序帧文件列表（帧不全时为None）"""
+        with self.lock:
+            index = {
+                'source': source,
+                'files': files,
+                'folder_mtime_ns': folder_mtime_ns,
+                'frames': list(self.entries.values())
+            }
+            data = json.dumps(index).encode("utf-8")
+            self.file.write(data)
+            self.file.write(struct.pack("<Q", len(data)))
+            self.file.write(PreviewCache.MAGIC)
+            self.file.close()
+        os.replace(self.temp_path, self.path)
+    
+    def discard(self):
+        """放弃写入，删除临时文件"""
+        with self.lock:
+            self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+class PreviewCache:
+    """
+    磁盘上的缩放帧缓存，避免每次启动都重新读取和缩放原始图片
+    每个特效（按特效路径、目标尺寸和存储方式区分）保存为一个容器文件，
+    帧按源文件名、修改时间和大小校验，总大小超过上限时删除最久未使用的容器
+    """
+    
+    MAGIC = b"EFPV0001"
+    SUFFIX = ".efpv"
+    
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+    
+    def container_path(self, effect_path, target, codec="zlib"):
+        """特效预览容器的文件路径，target为(最大宽度, 最大高度, 缩放质量)，codec为帧的存储方式"""
+        key = f"{os.path.normcase(os.path.abspath(effect_path))}|{target[0]}x{target[1]}|{target[2]}|{codec}"
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, name + self.SUFFIX)
+    
+    def open(self, effect_path, target, codec="zlib"):
+        """打开特效的预览容器，不存在或损坏时返回None"""
+        path = self.container_path(effect_path, target, codec)
+        try:
+            container = PreviewContainer(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"读取预览缓存失败 {path}: {e}")
+            return None
+        try:
+            # 更新修改时间作为最近使用时间
+            os.utime(path)
+        except OSError:
+            pass
+        return container
+    
+    def create_writer(self, effect_path, target, codec="zlib"):
+        """创建特效预览容器的写入器"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            return PreviewWriter(self.container_path(effect_path, target, codec), codec)
+        except OSError as e:
+            print(f"创建预览缓存失败: {e}")
+            return None
+    
+    def evict(self):
+        """总大小超过上限时，按最近使用时间从旧到新删除容器文件"""
+        with self.lock:
+            try:
+                files = []
+                with os.scandir(self.cache_dir) as entries:
+                    for entry in entries:
+                        if entry.is_file() and entry.name.endswith(self.SUFFIX):
+                            stat = entry.stat()
+                            files.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError as e:
+                print(f"清理预览缓存失败: {e}")
+                return
+            
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError as e:
+                    print(f"删除预览缓存失败 {path}: {e}")
+
+class PreviewSession:
+    """
+    一次加载过程中对单个特效预览容器的读写
+    有效的帧直接从容器读取，缺失或过期的帧在解码后写入新的容器
+    """
+    
+    def __init__(self, cache, effect_path, target, codec="zlib"):
+        self.cache = cache
+        self.effect_path = effect_path
+        self.target = target  # (最大宽度, 最大高度, 缩放质量)
+        self.codec = codec
+        try:
+            # 在列出帧文件之前记录文件夹修改时间，加载期间的变化会使容器在下次失效
+            self.folder_mtime_ns = os.stat(effect_path).st_mtime_ns
+        except OSError:
+            self.folder_mtime_ns = None
+        self.container = cache.open(effect_path, target, codec)
+        self.writer = None
+        self.valid_names = set()  # 本次加载中校验通过的容器帧
+        self.trusted = False  # 不压缩的容器比特效文件夹新时直接信任容器，不再逐个检查源文件
+        self.closed = False
+        self.lock = threading.Lock()
+    
+    def current_files(self):
+        """
+        不压缩的容器完整且保存后文件夹没有变化时返回容器中的有序帧列表，否则返回None
+        之后的帧直接从容器读取，不再列目录和检查每个源文件
+        原地覆盖帧文件不会改变文件夹的修改时间，这种修改要等文件夹变化后才会被发现，
+        所以只有选择了不压缩预览缓存时才这样做，默认的压缩缓存仍然逐帧校验源文件
+        """
+        container = self.container
+        if (self.codec != "raw" or container is None or not container.files or self.folder_mtime_ns is None
+                or container.folder_mtime_ns != self.folder_mtime_ns):
+            return None
+        self.trusted = True
+        return list(container.files)
+    
+    def signature(self, name, img_path):
+        """返回源文件的(修改时间, 大小)，信任容器时直接使用容器中的记录"""
+        if self.trusted:
+            entry = self.container.entries.get(name)
+            if entry is not None:
+                return entry['mtime_ns'], entry['size']
+        stat = os.stat(img_path)
+        return stat.st_mtime_ns, stat.st_size
+    
+    def load(self, name, signature):
+        """从容器读取一帧，不存在或已过期时返回None"""
+        if self.container is None:
+            return None
+        entry = self.container.lookup(name, signature)
+        if entry is None:
+            return None
+        try:
+            img = self.container.read_image(entry)
+        except (OSError, ValueError, zlib.error) as e:
+            print(f"读取预览缓存失败 {name}: {e}")
+            return None
+        with self.lock:
+            self.valid_names.add(name)
+        return img
+    
+    def store(self, name, signature, img):
+        """容器中没有有效的这一帧时写入新容器"""
+        if self.container is not None and self.container.lookup(name, signature) is not None:
+            with self.lock:
+                self.valid_names.add(name)
+            return
+        with self.lock:
+            if self.closed:
+                return
+            if self.writer is None:
+                self.writer = self.cache.create_writer(self.effect_path, self.target, self.codec)
+            writer = self.writer
+        if writer is not None and name not in writer.entries:
+            writer.add_image(name, signature, img)
+    
+    def commit(self, image_files):
+        """加载完成后在后台调用：需要时把有效的旧帧复制到新容器并替换旧容器"""
+        try:
+            container = self.container
+            if (self.writer is None and container is not None and not self.trusted
+                    and self.valid_names.issuperset(image_files)
+                    and (container.files != list(image_files) or container.folder_mtime_ns != self.folder_mtime_ns)):
+                # 帧都没有变化但文件列表或文件夹修改时间已过期，重写容器以更新索引
+                with self.lock:
+                    if not self.closed:
+                        self.writer = self.cache.create_writer(self.effect_path, self.target, self.codec)
+            if self.writer is not None:
+                if self.container is not None:
+                    for name in self.valid_names - set(self.writer.entries):
+                        entry = self.container.entries[name]
+                        with self.container.read_blob(entry) as blob:
+                            self.writer.add_blob(entry, blob)
+                    self.container.close()
+                complete = all(name in self.writer.entries for name in image_files)
+                self.writer.commit(self.effect_path, list(image_files) if complete else None,
+                                   self.folder_mtime_ns)
+                self.cache.evict()
+            elif self.container is not None:
+                self.container.close()
+        except (OSError, ValueError) as e:
+            print(f"保存预览缓存失败 {self.effect_path}: {e}")
+            self.discard()
+    
+    def discard(self):
+        """放弃本次写入"""
+        with self.lock:
+            self.closed = True
+        if self.writer is not None:
+            self.writer.discard()
+        if self.container is not None:
+            self.container.close()
+
+class FrameLoadJob:
+    """一次序列帧加载任务：按顺序提交解码任务，界面线程按顺序取回结果放入frames"""
+    
+    def __init__(self, effect_path, effect_name, image_files, target, frames, preview=None):
+        self.effect_path = effect_path
+        self.effect_name = effect_name
+        self.image_files = image_files
+        self.target = target  # (最大宽度, 最大高度, 缩放质量)
+        self.frames = frames  # 接收解码结果的FrameSequence
+        self.start_time = time.monotonic()
+        self.first_frame_time = None  # 第一帧显示的时间
+        self.preview = preview  # 预览缓存的读写会话
+        self.futures = {}  # 帧索引 -> 解码任务
+        self.next_submit = 0  # 下一个要提交的帧
+        self.next_index = 0  # 界面线程下一个要取回的帧
+        self.cancelled = False
+    
+    def cancel(self):
+        """取消任务，尚未开始的解码任务不再执行"""
+        self.cancelled = True
+        for future in self.futures.values():
+            future.cancel()
+        self.futures = {}
+        if self.preview is not None:
+            self.preview.discard()
+
+class PrefetchJob:
+    """
+    预读任务：自动播放下一个时，在后台把接下来几个特效的帧解码进帧缓存
+    只在没有前台加载任务时提交解码，避免和当前特效争抢解码线程
+    """
+    
+    def __init__(self, effects, target):
+        self.target = target  # (最大宽度, 最大高度, 缩放质量)
+        self.pending = collections.deque()  # 待解码的(特效路径, 帧路径)
+        self.remaining = {}  # 特效路径 -> 尚未解码完成的帧数
+        for effect_path, image_files in effects:
+            self.remaining[effect_path] = len(image_files)
+            for img_file in image_files:
+                self.pending.append((effect_path, os.path.join(effect_path, img_file)))
+        self.futures = {}  # 解码任务 -> 特效路径
+        self.image_files = dict(effects)  # 特效路径 -> 帧文件列表
+        self.previews = {}  # 特效路径 -> 尚未提交的预览缓存会话
+        self.cancelled = False
+    
+    def is_ready(self, effect_path):
+        """指定特效的帧是否已全部预读完成"""
+        return self.remaining.get(effect_path) == 0
+    
+    def release(self, effect_path):
+        """
+        前台开始加载该特效时不再预读它，放弃它尚未提交的预览缓存会话，
+        已经解码的帧留在帧缓存中由前台直接使用，同一个容器不会有两个写入器
+        """
+        self.pending = collections.deque(item for item in self.pending if item[0] != effect_path)
+        self.remaining.pop(effect_path, None)
+        self.image_files.pop(effect_path, None)
+        preview = self.previews.pop(effect_path, None)
+        if preview is not None:
+            preview.discard()
+    
+    def cancel(self):
+        self.cancelled = True
+        self.pending.clear()
+        for future in self.futures:
+            future.cancel()
+        self.futures = {}
+        for preview in self.previews.values():
+            preview.discard()
+        self.previews = {}
+
+class PosterCache:
+    """
+    特效海报帧（序列中间的一帧）的磁盘缓存，选择或悬停特效时立即显示，不需要等待序列帧加载
+    每个特效保存为一张合成到黑色背景（与预览画布相同）上的JPEG，
+    索引文件记录每张海报对应的源帧文件名、修改时间和大小
+    """
+    
+    SUFFIX = ".jpg"
+    
+    def __init__(self, cache_dir, memory_items=32):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.index = None  # 特效路径 -> 索引项，第一次使用时读取
+        self.dirty = False  # 索引是否有尚未保存的修改
+        self.memory_items = memory_items
+        self.images = collections.OrderedDict()  # 最近使用的海报（特效路径 -> PIL图像）
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def poster_frame(frames):
+        """特效的海报帧，使用中间一帧（很多特效的第一帧几乎是空白的）"""
+        return frames[len(frames) // 2] if frames else None
+    
+    def poster_path(self, effect_path):
+        key = os.path.normcase(os.path.abspath(effect_path))
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + self.SUFFIX)
+    
+    def _load_index(self):
+        """读取索引文件，调用时需要持有锁"""
+        if self.index is not None:
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        except FileNotFoundError:
+            self.index = {}
+        except (OSError, ValueError) as e:
+            print(f"读取海报索引失败: {e}")
+            self.index = {}
+    
+    def is_valid(self, effect_path, frame, signature):
+        """已保存的海报是否来自指定的源帧且源帧没有变化"""
+        with self.lock:
+            self._load_index()
+            entry = self.index.get(effect_path)
+        return (entry is not None and entry['frame'] == frame
+                and (entry['mtime_ns'], entry['size']) == tuple(signature))
+    
+    def get(self, effect_path):
+        """读取特效的海报，没有时返回None"""
+        with self.lock:
+            img = self.images.get(effect_path)
+            if img is not None:
+                self.images.move_to_end(effect_path)
+                return img
+            self._load_index()
+            if effect_path not in self.index:
+                return None
+        try:
+            with Image.open(self.poster_path(effect_path)) as poster:
+                img = poster.convert("RGB")
+        except (OSError, ValueError) as e:
+            print(f"读取海报失败 {effect_path}: {e}")
+            return None
+        self._remember(effect_path, img)
+        return img
+    
+    def put(self, effect_path, frame, signature, img):
+        """保存海报，可以在解码线程中调用"""
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = Image.new("RGBA", img.size, (0, 0, 0, 255))
+            img = Image.alpha_composite(background, img)
+        img = img.convert("RGB")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        img.save(self.poster_path(effect_path), "JPEG", quality=85)
+        with self.lock:
+            self._load_index()
+            self.index[effect_path] = {'frame': frame, 'mtime_ns': signature[0], 'size': signature[1]}
+            self.dirty = True
+        self._remember(effect_path, img)
+    
+    def save_index(self):
+        """保存索引文件（先写临时文件再替换）"""
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.index, ensure_ascii=False)
+            self.dirty = False
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            print(f"保存海报索引失败: {e}")
+    
+    def _remember(self, effect_path, img):
+        with self.lock:
+            self.images[effect_path] = img
+            self.images.move_to_end(effect_path)
+            while len(self.images) > self.memory_items:
+                self.images.popitem(last=False)
+
+class PosterJob:
+    """扫描完成后在后台为所有特效生成海报的任务，只在没有前台加载任务时提交"""
+    
+    def __init__(self, effects, target):
+        self.target = target  # (最大宽度, 最大高度, 缩放质量)
+        self.pending = collections.deque(effects)  # 待生成海报的特效
+        self.futures = {}  # 生成任务 -> 特效路径
+        self.created = 0  # 新生成的海报数量
+        self.cancelled = False
+    
+    def cancel(self):
+        self.cancelled = True
+        self.pending.clear()
+        for future in self.futures:
+            future.cancel()
+        self.futures = {}
+
+class FrameSequence:
+    """
+    当前特效已加载的帧，按索引返回PhotoImage
+    帧数不超过常驻窗口时保留全部PhotoImage；超过时只保留播放位置附近（按播放方向偏向前方）
+    一个窗口内的PhotoImage，其余帧以压缩后的像素数据保存，播放到附近时再还原
+    """
+    
+    def __init__(self, total, window):
+        self.total = total  # 预期的总帧数
+        self.window = window  # 常驻PhotoImage的帧数，0为全部常驻
+        self.windowed = 0 < window < total
+        self.photos = {}  # 帧索引 -> PhotoImage
+        self.packed = []  # 帧索引 -> 压缩后的帧数据（仅窗口模式）
+        self.packed_bytes = 0  # 压缩数据的总字节数
+        self.photo_bytes = 0  # 单个PhotoImage的像素字节数（按每像素4字节估算）
+        self.count = 0
+        self.playhead = 0
+        self.direction = 1  # 1为正序，-1为反序
+    
+    @staticmethod
+    def pack(img):
+        """把帧压缩为(模式, 尺寸, 数据)，可以在解码线程中调用"""
+        if img.mode not in ("RGBA", "RGB", "LA", "L"):
+            img = img.convert("RGBA")
+        return img.mode, img.size, zlib.compress(img.tobytes(), 1)
+    
+    @staticmethod
+    def unpack(packed):
+        mode, size, data = packed
+        return Image.frombytes(mode, size, zlib.decompress(data))
+    
+    def __len__(self):
+        return self.count
+    
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        photo = self.photos.get(index)
+        if photo is None:
+            photo = self._materialize(index)
+        return photo
+    
+    def append(self, img, packed=None):
+        """添加下一帧，窗口模式下需要同时提供压缩数据"""
+        index = self.count
+        self.count += 1
+        self.photo_bytes = img.width * img.height * 4
+        if self.windowed:
+            self.packed.append(packed)
+            self.packed_bytes += len(packed[2])
+            if not self._in_window(index):
+                return
+        self.photos[index] = ImageTk.PhotoImage(img)
+    
+    def set_playhead(self, index, direction):
+        """移动播放位置，释放窗口之外的PhotoImage"""
+        self.playhead = index
+        self.direction = direction
+        if self.windowed:
+            for i in [i for i in self.photos if not self._in_window(i)]:
+                del self.photos[i]
+    
+    def materialize_ahead(self, limit=2):
+        """按播放方向还原播放位置前方窗口内尚未常驻的帧，每次最多还原limit帧"""
+        if not self.windowed or not self.count:
+            return
+        for step in range(1, self._ahead() + 1):
+            index = (self.playhead + step * self.direction) % self._length()
+            if index >= self.count:
+                break  # 还没有加载到
+            if index not in self.photos:
+                self._materialize(index)
+                limit -= 1
+                if limit <= 0:
+                    break
+    
+    def resident_count(self):
+        """当前常驻的PhotoImage数量"""
+        return len(self.photos)
+    
+    def memory_bytes(self):
+        """估算常驻PhotoImage和压缩数据占用的内存"""
+        return len(self.photos) * self.photo_bytes + self.packed_bytes
+    
+    def _length(self):
+        return max(self.total, self.count, 1)
+    
+    def _ahead(self):
+        # 窗口的四分之三留给播放方向前方
+        return self.window - self.window // 4
+    
+    def _in_window(self, index):
+        """按播放方向计算的循环距离是否落在窗口内"""
+        length = self._length()
+        distance = (index - self.playhead) * self.direction % length
+        return distance <= self._ahead() or length - distance <= self.window // 4
+    
+    def _materialize(self, index):
+        photo = ImageTk.PhotoImage(self.unpack(self.packed[index]))
+        if self._in_window(index):
+            self.photos[index] = photo
+        return photo
+
+class PerfMetrics:
+    """
+    性能统计：解码线程中每帧的解码和缩放耗时、帧的来源（内存缓存、磁盘缓存或原图），
+    以及每次加载和播放的记录，可以导出为JSON或CSV
+    """
+    
+    def __init__(self, max_samples=1000):
+        self.decode_times = collections.deque(maxlen=max_samples)  # 最近的解码耗时（秒）
+        self.resize_times = collections.deque(maxlen=max_samples)  # 最近的缩放耗时（秒）
+        self.sources = collections.Counter()  # 帧来源 -> 帧数
+        self.records = []  # 每次加载和播放的记录
+        self.started = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.lock = threading.Lock()
+    
+    def record_frame(self, source, decode_time=None, resize_time=None):
+        """记录一帧的来源（memory、disk或decode）和耗时，可以在解码线程中调用"""
+        with self.lock:
+            self.sources[source] += 1
+            if decode_time is not None:
+                self.decode_times.append(decode_time)
+            if resize_time is not None:
+                self.resize_times.append(resize_time)
+    
+    def add_record(self, kind, **values):
+        """添加一条加载或播放记录"""
+        record = {'kind': kind, 'time': time.strftime("%Y-%m-%d %H:%M:%S")}
+        record.update(values)
+        with self.lock:
+            self.records.append(record)
+    
+    @staticmethod
+    def percentile(values, percent):
+        if not values:
+            return None
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * percent / 100))]
+    
+    def snapshot(self):
+        """返回当前的解码统计（耗时单位为毫秒）"""
+        with self.lock:
+            decode_times = list(self.decode_times)
+            resize_times = list(self.resize_times)
+            sources = dict(self.sources)
+        result = {}
+        for name, values in (('decode', decode_times), ('resize', resize_times)):
+            for percent in (50, 95, 99):
+                value = self.percentile(values, percent)
+                result[f"{name}_p{percent}_ms"] = None if value is None else round(value * 1000, 2)
+        total = sum(sources.values())
+        result['frames_memory'] = sources.get('memory', 0)
+        result['frames_disk'] = sources.get('disk', 0)
+        result['frames_decoded'] = sources.get('decode', 0)
+        result['cache_hit_rate'] = round((total - sources.get('decode', 0)) / total, 3) if total else None
+        return result
+    
+    def export(self, path, machine, current):
+        """导出到文件，扩展名为.csv时每条记录一行，否则导出JSON"""
+        with self.lock:
+            records = [dict(record) for record in self.records]
+        if path.lower().endswith(".csv"):
+            columns = []
+            for record in records:
+                columns.extend(key for key in record if key not in columns)
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(records)
+        else:
+            data = {
+                'started': self.started,
+                'machine': machine,
+                'current': current,
+                'records': records
+            }
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+
+class EffectIndex:
+    """
+    特效筛选索引：所有特效按树中的顺序（分类和名称的自然排序）预先排好，
+    相对路径（包含分类和名称）预先转为小写，并在后台建立三字母组合到特效序号的倒排索引
+    查询是上一次查询的扩展时只在上一次的结果中查找
+    模糊搜索另外在后台为常见字符建立每个位置上的特效位图（Python整数，特效按路径从长到短对应各位），
+    按查询字符逐个用位运算求出所有匹配，只对按名称开头和路径长度挑选出的候选精确打分
+    """
+    
+    GRAM = 3
+    FUZZY_LIMIT = 200  # 模糊搜索最多返回的结果数量
+    FUZZY_BOUNDARY = "/_-. "  # 单词边界字符，匹配在边界之后的字符加分
+    
+    def __init__(self, effect_tree, sort_key):
+        self.categories = sorted(effect_tree, key=sort_key)
+        self.effects = []  # 按树中顺序排列的特效
+        self.category_of = []  # 特效序号 -> 分类序号
+        for category_index, category in enumerate(self.categories):
+            for effect in sorted(effect_tree[category], key=lambda e: sort_key(e['name'])):
+                self.effects.append(effect)
+                self.category_of.append(category_index)
+        self.texts = [self.search_text(effect) for effect in self.effects]
+        self.grams = None  # 三字母组合 -> 特效序号数组（升序），建立完成前为None
+        self.last_query = ""
+        self.last_result = range(len(self.effects))
+        self.all_groups = None  # 不筛选时的分组结果
+        self.char_bits = None  # 常见字符 -> 每个位置上是该字符的特效位图列表，建立完成前为None
+        self.rare_chars = None  # 不常见字符 -> 包含它的特效序号数组
+        self.head_bits = None  # 常见字符 -> 名称以它开头的特效位图
+        self.word_bits = None  # 常见字符 -> 名称中有单词以它开头的特效位图
+        self.bit_order = None  # 位图中的位 -> 特效序号，路径长的在低位
+        self.bit_of = None  # 特效序号 -> 位图中的位
+        self.all_bits = 0  # 所有特效的位图
+        self.fuzzy_query = ""
+        self.fuzzy_ranked = None  # 上一次模糊搜索排好序的结果
+        self.fuzzy_total = 0  # 上一次模糊搜索匹配的特效数量
+    
+    @staticmethod
+    def search_text(effect):
+        """筛选时匹配的文字：小写的相对路径"""
+        return effect['relative_path'].replace(os.sep, "/").lower()
+    
+    def build_grams(self):
+        """建立三字母组合的倒排索引，可以在后台线程中调用"""
+        grams = {}
+        for index, text in enumerate(self.texts):
+            for gram in {text[i:i + self.GRAM] for i in range(len(text) - self.GRAM + 1)}:
+                postings = grams.get(gram)
+                if postings is None:
+                    postings = grams[gram] = array.array("I")
+                postings.append(index)
+        self.grams = grams
+    
+    def filter(self, query):
+        """返回包含查询文字的特效序号（按树中顺序）"""
+        if not query:
+            result = range(len(self.effects))
+        else:
+            candidates = range(len(self.effects))
+            if self.last_query and self.last_query in query:
+                # 查询变长时结果只会更少，只检查上一次的结果
+                candidates = self.last_result
+            grams = self.grams
+            if grams is not None and len(query) >= self.GRAM:
+                # 候选范围取包含查询中某个三字母组合的最少的那部分特效
+                for i in range(len(query) - self.GRAM + 1):
+                    postings = grams.get(query[i:i + self.GRAM], ())
+                    if len(postings) < len(candidates):
+                        candidates = postings
+            texts = self.texts
+            result = [index for index in candidates if query in texts[index]]
+        self.last_query = query
+        self.last_result = result
+        return result
+    
+    def build_fuzzy(self):
+        """
+        建立模糊搜索的位图索引，可以在后台线程中调用
+        出现在至少1/64的特效中的字符才建立位图，不常见的字符只记录包含它的特效
+        位图中的位按路径从长到短（同样长度时序号大的在前）排列，第p个位置的位图只用到
+        路径长于p的那些低位，所有位图的总大小和路径的总长度成正比，每个位置都能建立位图
+        """
+        texts = self.texts
+        count = len(texts)
+        bit_order = sorted(range(count), key=lambda index: (len(texts[index]), index), reverse=True)
+        bit_of = array.array("I", bytes(4 * count))
+        for bit, index in enumerate(bit_order):
+            bit_of[index] = bit
+        # 第p个位置的位图覆盖的位数（路径长于p的特效数量）
+        widths = []
+        remaining = count
+        for bit in reversed(range(count)):
+            length = len(texts[bit_order[bit]])
+            while len(widths) < length:
+                widths.append(remaining)
+            remaining -= 1
+        sizes = [(width + 7) // 8 for width in widths]
+        
+        def to_bits(flags):
+            return int.from_bytes(flags, "little")
+        
+        postings = {}
+        for index, text in enumerate(texts):
+            for char in set(text):
+                ids = postings.get(char)
+                if ids is None:
+                    ids = postings[char] = array.array("I")
+                ids.append(index)
+        
+        threshold = max(1, count // 64)
+        size = (count + 7) // 8
+        char_bits = {}
+        head_bits = {}
+        word_bits = {}
+        rare_chars = {}
+        for char, ids in postings.items():
+            if len(ids) < threshold:
+                rare_chars[char] = ids
+                continue
+            rows = [bytearray(row_size) for row_size in sizes]
+            heads = bytearray(size)
+            words = bytearray(size)
+            for index in ids:
+                text = texts[index]
+                name_start = text.rfind("/") + 1
+                bit = bit_of[index]
+                mask = 1 << (bit & 7)
+                byte = bit >> 3
+                position = text.find(char)
+                while position >= 0:
+                    rows[position][byte] |= mask
+                    position = text.find(char, position + 1)
+                position = text.find(char, name_start)
+                while position >= 0:
+                    if position == name_start:
+                        heads[byte] |= mask
+                    if position == name_start or text[position - 1] in self.FUZZY_BOUNDARY:
+                        words[byte] |= mask
+                        break
+                    position = text.find(char, position + 1)
+            char_bits[char] = [to_bits(row) for row in rows]
+            head_bits[char] = to_bits(heads)
+            word_bits[char] = to_bits(words)
+        
+        self.rare_chars = rare_chars
+        self.head_bits = head_bits
+        self.word_bits = word_bits
+        self.bit_order = bit_order
+        self.bit_of = bit_of
+        self.all_bits = (1 << count) - 1
+        self.char_bits = char_bits
+    
+    @classmethod
+    def fuzzy_score(cls, text, query):
+        """
+        子序列匹配的相关度，越大越相关，不匹配时返回None
+        连续匹配、匹配在单词开头、匹配在名称（而不是上级目录）中加分，匹配字符之间的间隔减分
+        """
+        name_start = text.rfind("/") + 1
+        best = None
+        start = text.find(query[0])
+        while start >= 0:
+            # 从start开始找到最早结束的匹配，再从结尾往回收紧
+            end = start
+            for char in query[1:]:
+                end = text.find(char, end + 1)
+                if end < 0:
+                    return best
+            positions = [end]
+            for char in reversed(query[:-1]):
+                positions.append(text.rfind(char, start, positions[-1]))
+            positions.reverse()
+            
+            score = 0
+            previous = -2
+            for i, position in enumerate(positions):
+                bonus = 16
+                if position == previous + 1:
+                    bonus += 12
+                elif previous >= 0:
+                    bonus -= min(position - previous - 1, 6)
+                if position == 0 or text[position - 1] in cls.FUZZY_BOUNDARY:
+                    bonus += 10 if i == 0 else 6
+                if position >= name_start:
+                    bonus += 4
+                score += bonus
+                previous = position
+            if best is None or score > best:
+                best = score
+            # 在这个匹配之内开始的匹配收紧后不会更好
+            start = text.find(query[0], end + 1)
+        return best
+    
+    def fuzzy(self, query):
+        """
+        模糊搜索：查询中的字符依次出现在相对路径中即匹配
+        返回(按相关度排序的前FUZZY_LIMIT个特效序号, 匹配的特效数量)
+        """
+        if query == self.fuzzy_query and self.fuzzy_ranked is not None:
+            return self.fuzzy_ranked, self.fuzzy_total
+        texts = self.texts
+        size = self.FUZZY_LIMIT * 2  # 精确打分的候选数量
+        
+        char_bits = self.char_bits
+        if char_bits is None:
+            # 位图索引建立完成前逐个检查
+            matches = self._search_lines(query, range(len(texts)))
+            total = len(matches)
+            pool = sorted(matches, key=lambda index: len(texts[index]))[:size]
+        else:
+            rare = [self.rare_chars.get(char, ()) for char in set(query) if char not in char_bits]
+            if rare:
+                # 包含不常见字符时只需要检查包含它的少量特效
+                matched = self._to_bits(self._search_lines(query, min(rare, key=len)))
+            else:
+                matched = self._match_bits(query)
+            total = matched.bit_count()
+            pool = self._pick_candidates(query[0], matched, size)
+        
+        ranked = sorted(pool, key=lambda index: (-self.fuzzy_score(texts[index], query), len(texts[index]), index))
+        self.fuzzy_query = query
+        self.fuzzy_ranked = ranked[:self.FUZZY_LIMIT]
+        self.fuzzy_total = total
+        return self.fuzzy_ranked, total
+    
+    def _match_bits(self, query):
+        """
+        用位运算查找子序列匹配，返回匹配的特效位图
+        ends[位置]为已匹配的部分最早在该位置结束的特效，下一个字符在之后的位置上继续匹配
+        """
+        ends = None
+        for char in query:
+            waiting = self.all_bits if ends is None else 0
+            next_ends = []
+            for position, bits in enumerate(self.char_bits[char]):
+                hit = waiting & bits
+                if hit:
+                    waiting ^= hit
+                next_ends.append(hit)
+                if ends is not None and ends[position]:
+                    waiting |= ends[position]
+            ends = next_ends
+        matched = 0
+        for bits in ends:
+            matched |= bits
+        return matched
+    
+    def _search_lines(self, query, candidates):
+        """逐个检查候选特效的路径，返回包含查询子序列的特效序号"""
+        # 每个字符前只跳过不是该字符的部分，匹配失败时不会反复回溯
+        pattern = re.compile("".join(f"[^{re.escape(char)}]*{re.escape(char)}" for char in query), re.DOTALL)
+        return list(itertools.compress(candidates, map(pattern.match, map(self.texts.__getitem__, candidates))))
+    
+    def _to_bits(self, indexes):
+        """特效序号转为位图"""
+        flags = bytearray((len(self.texts) + 7) // 8)
+        bit_of = self.bit_of
+        for index in indexes:
+            bit = bit_of[index]
+            flags[bit >> 3] |= 1 << (bit & 7)
+        return int.from_bytes(flags, "little")
+    
+    def _pick_candidates(self, char, matched, size):
+        """
+        挑选需要精确打分的候选：名称以查询首字符开头的优先，其次是名称中有单词以它开头的，
+        最后是其余的匹配，同一类中路径短的优先
+        """
+        pool = []
+        taken = 0
+        for tier in (self.head_bits.get(char, 0), self.word_bits.get(char, 0), -1):
+            available = matched & tier & ~taken
+            taken |= available
+            # 路径短的在高位，从最高位开始取
+            while available:
+                bit = available.bit_length() - 1
+                pool.append(self.bit_order[bit])
+                if len(pool) >= size:
+                    return pool
+                available ^= 1 << bit
+        return pool
+    
+    def group(self, result):
+        """把特效序号按分类分组，返回[(分类, 特效列表)]"""
+        if isinstance(result, range) and self.all_groups is not None:
+            return self.all_groups
+        groups = []
+        current = None
+        for index in result:
+            category_index = self.category_of[index]
+            if category_index != current:
+                current = category_index
+                groups.append((self.categories[category_index], []))
+            groups[-1][1].append(self.effects[index])
+        if isinstance(result, range):
+            self.all_groups = groups
+        return groups
+
+class TreeBranch:
+    """
+    树形控件中一个分类（根目录的特效直接在根级别）下排好序的特效
+    特效节点按顺序分批插入，尚未插入的部分用排在最后的占位节点表示，
+    展开分类或占位节点滚动到可见时再插入下一批
+    """
+    
+    MORE_KEY = ["\U0010ffff"]  # 占位节点的排序键，排在所有特效名称之后
+    
+    def __init__(self, category, node, sort_key, effects=()):
+        self.category = category
+        self.node = node  # 分类节点，根目录的特效为""
+        self.sort_key = sort_key
+        self.effects = list(effects)  # 排序后的特效
+        self.keys = None  # 特效名称的排序键，增量插入时才计算
+        self.materialized = 0  # 已插入树形控件的特效数量（排在最前面的部分）
+        self.more_item = None  # 占位节点
+    
+    @property
+    def remaining(self):
+        return len(self.effects) - self.materialized
+    
+    def add(self, effect):
+        """按排序加入特效，返回位置"""
+        if self.keys is None:
+            self.keys = [self.sort_key(e['name']) for e in self.effects]
+        key = self.sort_key(effect['name'])
+        index = bisect.bisect_right(self.keys, key)
+        self.keys.insert(index, key)
+        self.effects.insert(index, effect)
+        return index
+    
+    def remove(self, effect):
+        """移除特效，返回原来的位置，不在其中时返回None"""
+        for index, e in enumerate(self.effects):
+            if e is effect:
+                del self.effects[index]
+                if self.keys is not None:
+                    del self.keys[index]
+                return index
+        return None
@@ -11,10 +11,279 @@ import os
 import subprocess
 import platform
 import re
+import bisect
+import queue
+import concurrent.futures
+import collections
 from PIL import Image, ImageTk
 import threading
 import time
 
+from effect_core import (
+    ScanCatalog, DirectoryWatcher, ScanJob, FrameCache, PreviewCache, PreviewSession, FrameLoadJob,
+    PrefetchJob, PosterCache, PosterJob, FrameSequence, PerfMetrics, EffectIndex, TreeBranch
+)
+
+# 用户配置目录，扫描索引等缓存文件保存在这里
+CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".effect_preview")
+# 磁盘预览缓存的总大小上限
+PREVIEW_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# 树形控件中每次插入的特效数量，其余特效在展开分类或滚动到可见时再插入
+TREE_CHUNK_SIZE = 200
+# 缩放质量预设：名称 -> (显示名称, draft和reduce之后至少保留目标尺寸的倍数, 最终的重采样滤镜)
+# 倍数为None时直接对原图做完整的重采样
+RESIZE_QUALITY_PRESETS = {
+    "fast": ("快速", 1, Image.Resampling.BILINEAR),
+    "balanced": ("均衡", 2, Image.Resampling.LANCZOS),
+    "best": ("最佳", None, Image.Resampling.LANCZOS)
+}
+
+class ContactTile:
+    """网格预览中的一个格子"""
+    
+    def __init__(self, effect, max_frames):
+        self.effect = effect
+        frames = effect['frames']
+        # 帧数较多时均匀抽帧，stride为每个抽取帧代表的原始帧数
+        count = min(len(frames), max_frames)
+        self.stride = len(frames) / count if count else 1
+        self.frame_files = [frames[int(i * self.stride)] for i in range(count)]
+        self.photos = [None] * count
+        self.loaded = 0  # 已经创建PhotoImage的帧数
+        self.futures = {}  # 解码任务 -> 帧序号
+        self.pending = False  # 是否已加入待解码队列
+        self.preview = None  # 预览缓存会话
+        self.image_item = None
+        self.text_item = None
+        self.shown = -1  # 当前显示的帧序号
+    
+    @property
+    def active(self):
+        return self.pending or self.loaded > 0 or bool(self.futures)
+    
+    def release(self):
+        """释放PhotoImage并取消尚未完成的解码"""
+        for future in self.futures:
+            future.cancel()
+        self.futures = {}
+        if self.preview is not None:
+            self.preview.discard()
+            self.preview = None
+        self.photos = [None] * len(self.frame_files)
+        self.loaded = 0
+        self.pending = False
+        self.shown = -1
+
+class ContactSheet:
+    """
+    网格预览窗口：以小尺寸同时循环播放一个分类下的所有特效
+    所有格子共用一个播放定时器，只解码滚动区域内可见的格子，移出视野的格子释放PhotoImage
+    """
+    
+    TILE_SIZE = 128  # 格子中帧的最大边长
+    TILE_PADDING = 6
+    LABEL_HEIGHT = 16
+    MAX_TILE_FRAMES = 24  # 每个格子最多使用的帧数
+    
+    def __init__(self, app, category, effects):
+        self.app = app
+        self.category = category
+        self.target = (self.TILE_SIZE, self.TILE_SIZE, "fast")  # 格子帧的缩放目标
+        self.tiles = [ContactTile(effect, self.MAX_TILE_FRAMES) for effect in effects]
+        self.queue = collections.deque()  # 待解码的(格子, 帧序号)
+        self.columns = 1
+        self.visible = range(0)  # 当前可见的格子序号
+        self.clock_start = time.monotonic()
+        self.tick_after_id = None
+        self.poll_after_id = None
+        self.layout_after_id = None
+        self.closed = False
+        
+        self.window = tk.Toplevel(app.root)
+        self.window.title(f"网格预览 - {category} ({len(effects)} 个特效)")
+        self.window.geometry("1000x700")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+        self.canvas = tk.Canvas(self.window, bg="black", highlightthickness=0)
+        scrollbar = ttk.Scrollbar(self.window, orient=tk.VERTICAL, command=self.on_scroll)
+        self.canvas.config(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        self.canvas.bind('<Configure>', self.on_configure)
+        self.canvas.bind('<MouseWheel>', self.on_mouse_wheel)
+        self.canvas.bind('<Button-4>', lambda e: self.on_scroll("scroll", -1, "units"))
+        self.canvas.bind('<Button-5>', lambda e: self.on_scroll("scroll", 1, "units"))
+        self.canvas.bind('<Double-Button-1>', self.on_double_click)
+        
+        for tile in self.tiles:
+            tile.image_item = self.canvas.create_image(0, 0)
+            tile.text_item = self.canvas.create_text(0, 0, text=tile.effect['name'], fill="white",
+                                                     font=("Arial", 8), width=self.TILE_SIZE)
+        self._layout()
+        self._tick()
+    
+    def cell_size(self):
+        return (self.TILE_SIZE + self.TILE_PADDING * 2,
+                self.TILE_SIZE + self.LABEL_HEIGHT + self.TILE_PADDING * 2)
+    
+    def on_configure(self, event):
+        """窗口大小改变后重新排列格子"""
+        if self.layout_after_id is not None:
+            self.window.after_cancel(self.layout_after_id)
+        self.layout_after_id = self.window.after(100, self._layout)
+    
+    def on_scroll(self, *args):
+        self.canvas.yview(*args)
+        self._update_visible()
+    
+    def on_mouse_wheel(self, event):
+        self.on_scroll("scroll", -1 if event.delta > 0 else 1, "units")
+    
+    def on_double_click(self, event):
+        """双击格子在主窗口中打开该特效"""
+        index = self._tile_at(self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+        if index is not None:
+            effect = self.tiles[index].effect
+            # 选中树中的特效，由选择事件加载到主预览区
+            self.app.select_effect_in_tree(effect['path'])
+            self.app.root.lift()
+    
+    def _tile_at(self, x, y):
+        cell_width, cell_height = self.cell_size()
+        column, row = int(x // cell_width), int(y // cell_height)
+        index = row * self.columns + column
+        if 0 <= column < self.columns and 0 <= index < len(self.tiles):
+            return index
+        return None
+    
+    def _layout(self):
+        """按窗口宽度排列格子"""
+        self.layout_after_id = None
+        cell_width, cell_height = self.cell_size()
+        self.columns = max(1, self.canvas.winfo_width() // cell_width)
+        for index, tile in enumerate(self.tiles):
+            row, column = divmod(index, self.columns)
+            x = column * cell_width + cell_width // 2
+            y = row * cell_height + self.TILE_PADDING
+            self.canvas.coords(tile.image_item, x, y + self.TILE_SIZE // 2)
+            self.canvas.coords(tile.text_item, x, y + self.TILE_SIZE + self.LABEL_HEIGHT // 2)
+        rows = (len(self.tiles) + self.columns - 1) // self.columns
+        self.canvas.config(scrollregion=(0, 0, self.columns * cell_width, rows * cell_height))
+        self.canvas.yview_scroll(0, "units")
+        self._update_visible()
+    
+    def _update_visible(self):
+        """根据滚动位置确定可见的格子：加载新出现的格子，释放远离视野的格子"""
+        _, cell_height = self.cell_size()
+        top = self.canvas.canvasy(0)
+        bottom = self.canvas.canvasy(self.canvas.winfo_height())
+        first_row = max(0, int(top // cell_height))
+        last_row = int(bottom // cell_height)
+        self.visible = range(first_row * self.columns,
+                             min(len(self.tiles), (last_row + 1) * self.columns))
+        
+        # 视野上下各保留一行，滚动回来时不需要重新解码
+        keep = range(max(0, (first_row - 1) * self.columns),
+                      min(len(self.tiles), (last_row + 2) * self.columns))
+        for index, tile in enumerate(self.tiles):
+            if tile.active and index not in keep:
+                tile.release()
+                self.canvas.itemconfig(tile.image_item, image="")
+        
+        # 可见的格子按顺序排在解码队列最前面
+        self.queue = collections.deque((tile, slot) for tile, slot in self.queue if tile.pending)
+        for index in reversed(self.visible):
+            tile = self.tiles[index]
+            if not tile.active:
+                tile.pending = True
+                tile.preview = self.app._open_preview_session(tile.effect['path'], self.target)
+                self.queue.extendleft((tile, slot) for slot in reversed(range(len(tile.frame_files))))
+        if self.poll_after_id is None and self.queue:
+            self._poll()
+    
+    def _poll(self):
+        """提交解码任务并取回结果，在途任务数量受限，避免阻塞主窗口的加载"""
+        self.poll_after_id = None
+        if self.closed:
+            return
+        
+        deadline = time.monotonic() + 0.010
+        in_flight = 0
+        for tile in self.tiles:
+            if not tile.futures:
+                continue
+            for future, slot in list(tile.futures.items()):
+                if not future.done():
+                    in_flight += 1
+                    continue
+                del tile.futures[future]
+                if time.monotonic() >= deadline:
+                    in_flight += 1
+                    tile.futures[future] = slot
+                    continue
+                try:
+                    tile.photos[slot] = ImageTk.PhotoImage(future.result())
+                    tile.loaded += 1
+                except Exception as e:
+                    print(f"加载网格预览失败 {tile.effect['path']}: {e}")
+                    tile.photos[slot] = ImageTk.PhotoImage(Image.new("RGBA", (1, 1)))
+                    tile.loaded += 1
+                if slot == 0:
+                    self.canvas.itemconfig(tile.image_item, image=tile.photos[0])
+                    tile.shown = 0
+                if tile.loaded == len(tile.frame_files) and tile.preview is not None:
+                    # 格子加载完成后在后台保存磁盘预览缓存
+                    # 只保存了抽取的帧，传入完整帧列表使容器不被当作完整的帧列表使用
+                    self.app.decode_pool.submit(tile.preview.commit, tile.effect['frames'])
+                    tile.preview = None
+        
+        max_in_flight = self.app.decode_workers * 2
+        while self.queue and in_flight < max_in_flight:
+            tile, slot = self.queue.popleft()
+            img_path = os.path.join(tile.effect['path'], tile.frame_files[slot])
+            future = self.app.decode_pool.submit(self.app._decode_frame, img_path, self.target, tile.preview)
+            tile.futures[future] = slot
+            in_flight += 1
+            # 同一个格子的帧在队列中是连续的
+            tile.pending = bool(self.queue) and self.queue[0][0] is tile
+        
+        if in_flight or self.queue:
+            self.poll_after_id = self.window.after(15, self._poll)
+    
+    def _tick(self):
+        """共用的播放定时器：按统一的时钟计算每个可见格子应显示的帧"""
+        self.tick_after_id = None
+        if self.closed:
+            return
+        interval = self.app._get_frame_interval()
+        elapsed = time.monotonic() - self.clock_start
+        for index in self.visible:
+            tile = self.tiles[index]
+            count = len(tile.frame_files)
+            if not count or tile.loaded < count:
+                continue
+            slot = int(elapsed / (interval * tile.stride)) % count
+            if slot != tile.shown:
+                tile.shown = slot
+                self.canvas.itemconfig(tile.image_item, image=tile.photos[slot])
+        # 按时钟对齐到下一帧，避免误差累积
+        delay = interval - elapsed % interval
+        self.tick_after_id = self.window.after(max(1, int(delay * 1000)), self._tick)
+    
+    def close(self):
+        """关闭窗口并释放所有格子"""
+        self.closed = True
+        for after_id in (self.tick_after_id, self.poll_after_id, self.layout_after_id):
+            if after_id is not None:
+                self.window.after_cancel(after_id)
+        for tile in self.tiles:
+            tile.release()
+        self.queue.clear()
+        self.window.destroy()
+        if self.app.contact_sheet is self:
+            self.app.contact_sheet = None
+
 class EffectPreview:
     def __init__(self, root):
         self.root = root
@@ -28,28 +297,129 @@ class EffectPreview:
         self.max_scan_depth = 5  # 最大扫描深度
         self.is_playing = False
         self.current_frame = 0
-        self.frames = []
-        self.play_thread = None
+        self.frames = []  # 当前特效已加载的帧（FrameSequence）
+        self.total_frames = 0  # 当前特效的总帧数（流式加载时frames只包含已加载的部分）
+        self.play_after_id = None  # 下一次播放定时的after标识
+        self.play_clock_start = 0.0  # 播放时钟的起点（time.monotonic）
+        self.play_clock_slots = 0  # 从时钟起点开始已经消耗的帧时隙
+        self.frames_played = 0  # 本轮已经播放的帧数（用于自动播放下一个）
+        self.frames_dropped = 0  # 因渲染落后而跳过的帧数
+        self.shown_times = collections.deque()  # 最近一秒内每次显示帧的时间，用于统计实际帧率
+        self.fps_label_time = 0.0  # 上次更新帧率显示的时间
+        self.play_start_time = None  # 本次播放开始的时间，用于性能记录
+        self.play_shown = 0  # 本次播放显示的帧数
+        
+        # 性能统计
+        self.perf_metrics = PerfMetrics()
+        self.hud_item = None  # 画布上的性能浮层
+        self.hud_after_id = None  # 性能浮层的刷新定时器
+        self.contact_sheet = None  # 网格预览窗口
         self.effect_tree = {}  # 存储分类的特效树
         self.current_effect_list = []  # 当前特效列表（用于自动播放下一个）
         self.current_effect_index = -1  # 当前特效在列表中的索引
         self.is_loading = False  # 是否正在加载
+        self.reload_pending_path = None  # 加载期间文件夹发生变化的特效，加载完成后重新加载
         self.is_auto_playing_next = False  # 是否正在自动播放下一个
         
+        # 序列帧解码线程池
+        self.decode_workers = max(2, os.cpu_count() or 2)
+        self.decode_pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.decode_workers,
+                                                                 thread_name_prefix="decode")
+        self.frame_load_job = None  # 当前的序列帧加载任务
+        self.frame_cache = FrameCache(512 * 1024 * 1024)  # 跨特效的缩放帧缓存
+        self.preview_cache = PreviewCache(os.path.join(CONFIG_DIR, "previews"),
+                                          PREVIEW_CACHE_MAX_BYTES)  # 磁盘上的缩放帧缓存
+        self.prefetch_job = None  # 自动播放下一个时的预读任务
+        self.poster_cache = PosterCache(os.path.join(CONFIG_DIR, "posters"))  # 特效海报帧的磁盘缓存
+        self.poster_job = None  # 扫描完成后生成海报的任务
+        self.poster_tip = None  # 树形控件中悬停显示的海报窗口
+        self.poster_tip_item = None  # 鼠标当前悬停的树节点
+        self.poster_tip_after_id = None  # 悬停显示海报的延迟定时器
+        self.rerender_job = None  # 画布尺寸改变后按新尺寸重新缩放当前特效的任务
+        self.render_size = (600, 400)  # 帧缩放的目标尺寸，跟随画布大小
+        self.canvas_size = (600, 400)  # 画布当前大小
+        self.resize_after_id = None  # 画布尺寸变化的防抖定时器
+        self.canvas_image_item = None  # 画布上显示帧的图像项，切换帧时只替换图像
+        self.canvas_photo = None  # 画布当前显示的PhotoImage（保持引用）
+        self.frame_info_after_id = None  # 帧信息显示的节流定时器
+        self.frame_info_text = ""  # 帧信息当前显示的文字
+        self.frames_target = None  # 当前帧的缩放目标
+        self.current_image_files = []  # 当前特效的帧文件列表
+        self.play_when_ready = False  # 第一帧加载完成后是否自动开始播放
+        self.tree_key_browsing = False  # 选择是否来自键盘浏览
+        self.select_after_id = None  # 键盘浏览时延迟加载所选特效的定时器
+        
+        # 时间轴定位：尚未加载的帧在单独的线程中按需解码，不排在加载任务后面
+        self.seek_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="seek")
+        self.seek_index = None  # 正在定位的尚未加载的帧，None表示显示的是已加载的帧
+        self.seek_future = None  # 正在进行的定位解码任务
+        self.seek_request = None  # 等待提交的(帧索引, 是否粗略)，拖动过程中只保留最新的请求
+        self.seek_shown = None  # 画布上显示的定位帧(帧索引, 是否粗略)
+        self.seek_refine_after_id = None  # 停止拖动后换成完整质量帧的定时器
+        
+        # 后台扫描状态
+        self.scan_thread = None
+        self.scan_queue = queue.Queue()  # 扫描线程向界面线程推送结果的队列
+        self.scan_job = None  # 当前（或最近一次）扫描任务
+        self.tree_category_nodes = {}  # 分类 -> 树节点
+        self.tree_child_keys = {}  # 树节点 -> 已插入子项的排序键（用于有序插入）
+        self.tree_message_item = None  # 树形控件中的提示项
+        self.scan_catalog = ScanCatalog(os.path.join(CONFIG_DIR, "scan_index.db"))  # 持久化扫描索引
+        self.scan_nodes = {}  # 最近一次扫描得到的目录节点（相对路径 -> 节点）
+        self.graph_depth = 0  # scan_nodes完整覆盖的扫描深度
+        self.tree_effect_items = {}  # 特效路径 -> 树节点（只包含已插入的特效）
+        self.tree_branches = {}  # 分类 -> TreeBranch
+        self.tree_open_categories = set()  # 展开的分类，重建树时保持展开
+        self.tree_filter_open = set()  # 筛选结果较少时自动展开的分类，清除筛选后恢复折叠
+        self.tree_check_after_id = None  # 检查占位节点是否可见的定时器
+        self.effect_index = None  # 特效筛选索引，特效树变化后重新建立
+        self.filter_after_id = None  # 筛选输入的防抖定时器
+        self.tree_flat = False  # 树形控件中是否平铺显示模糊搜索的结果
+        
+        # 目录监视状态
+        self.dir_watcher = None
+        self.watch_queue = None
+        
         # 创建界面
         self.create_widgets()
         
         # 初始化界面状态
         self.init_ui_state()
+        
+        # 关闭窗口时停止所有后台任务
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
     
     def init_ui_state(self):
         """初始化UI状态"""
         # 显示初始提示
-        self.effect_tree_widget.insert("", "end", text="请选择或拖拽文件夹开始扫描")
+        self._show_tree_message("请选择或拖拽文件夹开始扫描")
         self.stats_label.config(text="总计: 0 个特效")
         self.effect_name_label.config(text="未选择特效")
         self.effect_path_label.config(text="")
         self.effect_stats_label.config(text="")
+        self.update_cache_stats()
+    
+    def on_close(self):
+        """
+        关闭主窗口：取消扫描、加载、预读和海报任务，停止目录监视，
+        线程池中排队的任务直接取消，不等待它们完成（否则进程会在窗口关闭后继续扫描）
+        """
+        if self.scan_job is not None:
+            self.scan_job.cancel()
+        if self.poster_job is not None:
+            self.poster_job.cancel()
+            self.poster_job = None
+        self._cancel_frame_loading()
+        self._stop_watcher()
+        if self.contact_sheet is not None:
+            self.contact_sheet.close()
+        
+        pools = [self.decode_pool, self.seek_pool]
+        if self.scan_job is not None and self.scan_job.pool is not None:
+            pools.append(self.scan_job.pool)
+        for pool in pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
     
     def natural_sort_key(self, text):
         """
@@ -88,11 +458,18 @@ class EffectPreview:
         self.reset_dir_button = ttk.Button(dir_buttons_frame, text="重置", command=self.reset_directory)
         self.reset_dir_button.pack(side=tk.LEFT)
         
+        # 监视目录变化选项
+        self.watch_var = tk.BooleanVar(value=False)
+        self.watch_check = ttk.Checkbutton(dir_buttons_frame, text="监视目录变化",
+                                           variable=self.watch_var, command=self.on_watch_change)
+        self.watch_check.pack(side=tk.LEFT, padx=(10, 0))
+        
         # 特效列表标题和筛选
         effect_header_frame = ttk.Frame(left_frame)
         effect_header_frame.pack(fill=tk.X, pady=(10, 5))
         
         ttk.Label(effect_header_frame, text="特效列表", font=("Arial", 12, "bold")).pack(side=tk.LEFT)
+        ttk.Button(effect_header_frame, text="网格预览", command=self.open_contact_sheet).pack(side=tk.RIGHT)
         
         # 筛选输入框
         filter_frame = ttk.Frame(left_frame)
@@ -104,19 +481,30 @@ class EffectPreview:
         filter_entry = ttk.Entry(filter_frame, textvariable=self.filter_var, width=20)
         filter_entry.pack(side=tk.LEFT, padx=(5, 0), fill=tk.X, expand=True)
         
+        # 模糊搜索：按相关度平铺显示匹配的特效
+        self.fuzzy_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(filter_frame, text="模糊", variable=self.fuzzy_var,
+                        command=self.on_filter_change).pack(side=tk.LEFT, padx=(5, 0))
+        
         # 特效树形控件
         tree_frame = ttk.Frame(left_frame)
         tree_frame.pack(fill=tk.BOTH, expand=True)
         
         self.effect_tree_widget = ttk.Treeview(tree_frame, height=15)
-        tree_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.effect_tree_widget.yview)
-        self.effect_tree_widget.config(yscrollcommand=tree_scrollbar.set)
+        self.tree_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.effect_tree_widget.yview)
+        self.effect_tree_widget.config(yscrollcommand=self.on_tree_scroll)
         
         self.effect_tree_widget.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        tree_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         # 绑定选择事件
         self.effect_tree_widget.bind('<<TreeviewSelect>>', self.on_effect_select)
+        self.effect_tree_widget.bind('<KeyPress>', self.on_tree_key)
+        self.effect_tree_widget.bind('<ButtonPress-1>', self.on_tree_click)
+        self.effect_tree_widget.bind('<Motion>', self.on_tree_motion)
+        self.effect_tree_widget.bind('<Leave>', self.hide_poster_tip)
+        self.effect_tree_widget.bind('<<TreeviewOpen>>', self.on_tree_open)
+        self.effect_tree_widget.bind('<<TreeviewClose>>', self.on_tree_close)
         
         # 扫描深度控制
         depth_frame = ttk.Frame(left_frame)
@@ -128,10 +516,36 @@ class EffectPreview:
                                    textvariable=self.depth_var, command=self.on_depth_change)
         depth_spinbox.pack(side=tk.LEFT, padx=5)
         
+        # 扫描线程数（网络共享目录可以适当调大）
+        ttk.Label(depth_frame, text="线程:").pack(side=tk.LEFT)
+        self.scan_workers_var = tk.IntVar(value=4)
+        workers_spinbox = ttk.Spinbox(depth_frame, from_=1, to=32, width=4,
+                                      textvariable=self.scan_workers_var)
+        workers_spinbox.pack(side=tk.LEFT, padx=5)
+        
         # 项目统计显示
         self.stats_label = ttk.Label(depth_frame, text="", foreground="gray")
         self.stats_label.pack(side=tk.LEFT, padx=(10, 0))
         
+        # 扫描控制：时间限制、取消和继续
+        scan_control_frame = ttk.Frame(left_frame)
+        scan_control_frame.pack(fill=tk.X, pady=(5, 0))
+        
+        ttk.Label(scan_control_frame, text="时间限制:").pack(side=tk.LEFT)
+        self.scan_budget_var = tk.IntVar(value=30)
+        budget_spinbox = ttk.Spinbox(scan_control_frame, from_=0, to=3600, increment=10, width=5,
+                                     textvariable=self.scan_budget_var)
+        budget_spinbox.pack(side=tk.LEFT, padx=5)
+        ttk.Label(scan_control_frame, text="秒 (0为不限)", foreground="gray").pack(side=tk.LEFT)
+        
+        self.resume_scan_button = ttk.Button(scan_control_frame, text="继续扫描", command=self.resume_scan)
+        self.resume_scan_button.pack(side=tk.RIGHT)
+        self.resume_scan_button.config(state=tk.DISABLED)
+        
+        self.cancel_scan_button = ttk.Button(scan_control_frame, text="取消扫描", command=self.stop_scan)
+        self.cancel_scan_button.pack(side=tk.RIGHT, padx=5)
+        self.cancel_scan_button.config(state=tk.DISABLED)
+        
         # 中间序列帧文件列表区域
         middle_frame = ttk.Frame(main_frame)
         middle_frame.pack(side=tk.LEFT, fill=tk.Y, padx=(5, 5))
@@ -187,8 +601,15 @@ class EffectPreview:
         self.loading_label.pack()
         
         # 预览画布
-        self.canvas = tk.Canvas(right_frame, bg="black", width=600, height=400)
-        self.canvas.pack(pady=10)
+        self.canvas = tk.Canvas(right_frame, bg="black", width=600, height=400, highlightthickness=0)
+        self.canvas.pack(pady=10, fill=tk.BOTH, expand=True)
+        self.canvas.bind('<Configure>', self.on_canvas_configure)
+        
+        # 时间轴，拖动时立即定位到对应帧
+        self.timeline_var = tk.DoubleVar(value=0)
+        self.timeline_scale = ttk.Scale(right_frame, from_=0, to=0, orient=tk.HORIZONTAL,
+                                        variable=self.timeline_var, command=self.on_timeline_change)
+        self.timeline_scale.pack(fill=tk.X, padx=10)
         
         # 控制按钮
         control_frame = ttk.Frame(right_frame)
@@ -209,7 +630,7 @@ class EffectPreview:
         # 自动播放下一个选项
         self.auto_next_var = tk.BooleanVar(value=False)
         self.auto_next_check = ttk.Checkbutton(control_frame, text="自动播放下一个", 
-                                             variable=self.auto_next_var)
+                                             variable=self.auto_next_var, command=self.on_auto_next_change)
         self.auto_next_check.pack(side=tk.LEFT, padx=5)
         
         # 反序播放选项
@@ -233,14 +654,97 @@ class EffectPreview:
         self.speed_label = ttk.Label(speed_frame, text="0.1s")
         self.speed_label.pack(side=tk.LEFT, padx=5)
         
+        # 缩放质量预设（只影响之后加载的特效）
+        ttk.Label(speed_frame, text="缩放质量:").pack(side=tk.LEFT, padx=(10, 0))
+        self.resize_quality_var = tk.StringVar(value=RESIZE_QUALITY_PRESETS["balanced"][0])
+        ttk.Combobox(speed_frame, textvariable=self.resize_quality_var, state="readonly", width=5,
+                     values=[label for label, _, _ in RESIZE_QUALITY_PRESETS.values()]).pack(side=tk.LEFT, padx=5)
+        
         # 帧信息
         self.frame_info = ttk.Label(right_frame, text="")
         self.frame_info.pack(pady=5)
+        
+        # 目标帧率和实际帧率
+        self.fps_label = ttk.Label(right_frame, text="", foreground="gray")
+        self.fps_label.pack()
+        
+        # 性能浮层和性能数据导出
+        self.perf_frame = ttk.Frame(right_frame)
+        self.perf_frame.pack(pady=5)
+        
+        self.hud_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.perf_frame, text="性能浮层", variable=self.hud_var,
+                        command=self.on_hud_toggle).pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.perf_frame, text="导出性能数据", command=self.export_metrics).pack(side=tk.LEFT, padx=5)
+        
+        # 性能状态面板，开启性能浮层时显示
+        self.perf_label = ttk.Label(right_frame, text="", foreground="gray", justify=tk.LEFT)
+        
+        # 帧缓存设置和统计
+        cache_frame = ttk.Frame(right_frame)
+        cache_frame.pack(pady=5)
+        
+        ttk.Label(cache_frame, text="帧缓存上限:").pack(side=tk.LEFT)
+        self.cache_limit_var = tk.IntVar(value=512)
+        cache_spinbox = ttk.Spinbox(cache_frame, from_=0, to=65536, increment=128, width=7,
+                                    textvariable=self.cache_limit_var, command=self.on_cache_limit_change)
+        cache_spinbox.pack(side=tk.LEFT, padx=5)
+        cache_spinbox.bind('<Return>', self.on_cache_limit_change)
+        cache_spinbox.bind('<FocusOut>', self.on_cache_limit_change)
+        ttk.Label(cache_frame, text="MB").pack(side=tk.LEFT)
+        
+        ttk.Label(cache_frame, text="预读:").pack(side=tk.LEFT, padx=(10, 0))
+        self.prefetch_count_var = tk.IntVar(value=2)
+        prefetch_spinbox = ttk.Spinbox(cache_frame, from_=0, to=10, width=3,
+                                       textvariable=self.prefetch_count_var, command=self.on_auto_next_change)
+        prefetch_spinbox.pack(side=tk.LEFT, padx=5)
+        prefetch_spinbox.bind('<Return>', self.on_auto_next_change)
+        ttk.Label(cache_frame, text="个特效").pack(side=tk.LEFT)
+        
+        # 预览缓存以未压缩帧保存，加载时不需要解压，占用磁盘较多；
+        # 特效文件夹没有变化时直接使用缓存中的帧列表，不再检查每个源文件
+        self.pack_frames_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(cache_frame, text="不压缩预览缓存",
+                        variable=self.pack_frames_var).pack(side=tk.LEFT, padx=(10, 0))
+        
+        # 帧数较多时只保留播放位置附近的PhotoImage
+        ttk.Label(cache_frame, text="常驻帧数:").pack(side=tk.LEFT, padx=(10, 0))
+        self.resident_window_var = tk.IntVar(value=120)
+        ttk.Spinbox(cache_frame, from_=0, to=10000, increment=20, width=5,
+                    textvariable=self.resident_window_var).pack(side=tk.LEFT, padx=5)
+        ttk.Label(cache_frame, text="(0为全部)", foreground="gray").pack(side=tk.LEFT)
+        
+        self.cache_stats_label = ttk.Label(cache_frame, text="", foreground="gray")
+        self.cache_stats_label.pack(side=tk.LEFT, padx=(10, 0))
+    
+    def on_cache_limit_change(self, event=None):
+        """当帧缓存上限改变时"""
+        try:
+            limit_mb = max(0, int(self.cache_limit_var.get()))
+        except (tk.TclError, ValueError):
+            return
+        self.frame_cache.set_max_bytes(limit_mb * 1024 * 1024)
+        self.update_cache_stats()
+    
+    def update_cache_stats(self):
+        """更新帧缓存统计显示"""
+        stats = self.frame_cache.stats()
+        self.cache_stats_label.config(
+            text=f"命中: {stats['hits']} | 未命中: {stats['misses']} | "
+                 f"{self._format_file_size(stats['bytes'])} / {self._format_file_size(stats['max_bytes'])}"
+        )
+    
+    def on_auto_next_change(self, event=None):
+        """当自动播放下一个或预读数量改变时，重新安排预读"""
+        self._start_prefetch()
     
     def on_speed_change(self, value):
         """当播放速度改变时"""
         speed = float(value)
         self.speed_label.config(text=f"{speed:.2f}s")
+        if self.is_playing:
+            # 从当前帧开始按新的间隔重新计时
+            self._reset_play_clock()
     
     def on_reverse_change(self):
         """当反序选项改变时"""
@@ -255,23 +759,158 @@ class EffectPreview:
             self.show_frame(self.current_frame)
     
     def on_filter_change(self, *args):
-        """当筛选条件改变时"""
-        self._build_tree()
+        """当筛选条件改变时，停止输入150ms后再更新，连续输入时不重复筛选"""
+        if self.filter_after_id is not None:
+            self.root.after_cancel(self.filter_after_id)
+        self.filter_after_id = self.root.after(150, self._apply_filter)
+    
+    def _apply_filter(self):
+        """按筛选条件更新特效列表，树形控件中只增删发生变化的节点"""
+        self.filter_after_id = None
+        if not self.effect_tree or self.tree_message_item is not None:
+            self._build_tree()
+            return
+        if self._fuzzy_query():
+            self._show_fuzzy_results()
+            return
+        if self.tree_flat:
+            # 从平铺的模糊搜索结果换回分类树
+            self._build_tree()
+            return
+        
+        filtered = self._iter_filtered_categories()
+        self.current_effect_list = [effect for _, effects in filtered for effect in effects]
+        expand_all = self._should_expand_all()
+        
+        # 删除没有筛选结果的分类
+        remaining = {category for category, _ in filtered}
+        for category in [c for c in self.tree_branches if c not in remaining]:
+            self._remove_branch(category)
+        
+        for category, effects in filtered:
+            branch = self.tree_branches.get(category)
+            if branch is None:
+                branch = self._create_branch(category, effects, expand_all)
+                self._show_branch(branch, expand_all)
+            else:
+                self._update_branch(branch, effects, expand_all)
+        
+        self._locate_current_effect()
+        self._update_selection_stats()
     
     def on_file_select(self, event):
         """当选择文件列表中的文件时，预览单张图片"""
         selection = self.file_listbox.curselection()
-        if selection and self.current_effect_path and self.frames:
+        if selection and self.current_effect_path and self.current_image_files:
             file_index = selection[0]
-            if 0 <= file_index < len(self.frames):
+            if 0 <= file_index < len(self.current_image_files):
                 # 停止当前播放
                 if self.is_playing:
                     self.pause_play()
                 
-                self.current_frame = file_index
-                self.show_frame(file_index)
+                # 尚未加载的帧直接按需解码完整质量的帧
+                self.seek_frame(file_index, scrubbing=False)
                 self.update_frame_info()
     
+    def on_timeline_change(self, value):
+        """拖动时间轴时定位到对应帧"""
+        if not self.current_image_files:
+            return
+        index = min(max(0, int(round(float(value)))), len(self.current_image_files) - 1)
+        if index == self.current_frame and self.seek_index is None and self.frames:
+            return
+        if self.is_playing:
+            self.pause_play()
+        self.seek_frame(index)
+    
+    def seek_frame(self, index, scrubbing=True):
+        """
+        定位到指定帧：已加载的帧直接显示，尚未加载的帧在定位线程中按需解码
+        拖动过程中先显示四分之一尺寸的粗略帧，停止拖动后再换成完整质量的帧
+        """
+        if self.seek_refine_after_id is not None:
+            self.root.after_cancel(self.seek_refine_after_id)
+            self.seek_refine_after_id = None
+        if index < len(self.frames):
+            self.show_frame(index)
+            return
+        
+        self.seek_index = index
+        self.current_frame = index
+        if self.frame_info_after_id is None:
+            self.frame_info_after_id = self.root.after(16, self._flush_frame_info)
+        if scrubbing:
+            self._request_seek_decode(index, True)
+            self.seek_refine_after_id = self.root.after(120, self._refine_seek)
+        else:
+            self._request_seek_decode(index, False)
+    
+    def _refine_seek(self):
+        """停止拖动后显示完整质量的帧，这时帧可能已经加载完成"""
+        self.seek_refine_after_id = None
+        index = self.seek_index
+        if index is None or self.seek_shown == (index, False):
+            return
+        if index < len(self.frames):
+            self.show_frame(index)
+        else:
+            self._request_seek_decode(index, False)
+    
+    def _request_seek_decode(self, index, coarse):
+        """提交定位帧的解码任务，同一时间只解码一帧，之后的请求只保留最新的一个"""
+        if self.seek_future is not None:
+            self.seek_request = (index, coarse)
+            return
+        self.seek_request = None
+        img_path = os.path.join(self.current_effect_path, self.current_image_files[index])
+        # 完整质量的帧和加载任务共用磁盘预览缓存，解码结果也会进入帧缓存供加载任务直接使用
+        job = self.frame_load_job
+        preview = job.preview if job is not None and not coarse else None
+        future = self.seek_pool.submit(self._decode_seek_frame, img_path, self.frames_target, coarse, preview)
+        self.seek_future = future
+        self.root.after(5, lambda: self._poll_seek_frame(future, index, coarse))
+    
+    def _decode_seek_frame(self, img_path, target, coarse, preview=None):
+        """在定位线程中解码一帧，粗略帧按四分之一尺寸快速解码后放大到目标尺寸"""
+        if not coarse:
+            return self._decode_frame(img_path, target, preview)
+        max_width, max_height, _ = target
+        img = self._decode_frame(img_path, (max(1, max_width // 4), max(1, max_height // 4), "fast"))
+        ratio = min(max_width / img.width, max_height / img.height)
+        return img.resize((max(1, int(img.width * ratio)), max(1, int(img.height * ratio))), Image.Resampling.BILINEAR)
+    
+    def _poll_seek_frame(self, future, index, coarse):
+        """取回定位帧并显示，然后提交等待中的最新请求"""
+        if future is not self.seek_future:
+            return  # 已经切换了特效
+        if not future.done():
+            self.root.after(5, lambda: self._poll_seek_frame(future, index, coarse))
+            return
+        
+        self.seek_future = None
+        # 拖动过程中粗略帧总是显示最近完成的一帧，完整质量的帧只在仍停留在该帧时显示
+        if self.seek_index is not None and (index == self.seek_index if not coarse
+                                            else self.seek_shown != (index, False)):
+            try:
+                self._show_photo(ImageTk.PhotoImage(future.result()))
+                self.seek_shown = (index, coarse)
+            except Exception as e:
+                print(f"定位帧失败 {self.current_image_files[index]}: {e}")
+        if self.seek_request is not None and self.seek_index is not None:
+            self._request_seek_decode(*self.seek_request)
+        else:
+            self.seek_request = None
+    
+    def _cancel_seek(self):
+        """放弃尚未完成的定位，正在解码的帧完成后不再显示"""
+        if self.seek_refine_after_id is not None:
+            self.root.after_cancel(self.seek_refine_after_id)
+            self.seek_refine_after_id = None
+        self.seek_index = None
+        self.seek_future = None
+        self.seek_request = None
+        self.seek_shown = None
+    
     def get_next_effect(self):
         """获取下一个特效"""
         if not self.current_effect_list or self.current_effect_index < 0:
@@ -296,26 +935,43 @@ class EffectPreview:
             # 加载并播放下一个特效
             self.load_effect_by_path(next_effect['path'], next_effect['name'])
             if self.auto_play_var.get():
-                self.root.after(100, self.start_play)
+                self._play_when_ready()
     
     def select_effect_in_tree(self, effect_path):
-        """在树形控件中选中指定的特效"""
-        # 遍历树形控件中的所有项目
-        def find_and_select(item=""):
-            children = self.effect_tree_widget.get_children(item)
-            for child in children:
-                values = self.effect_tree_widget.item(child, "values")
-                if values and len(values) >= 3 and values[0] == "effect" and values[2] == effect_path:
-                    # 找到了对应的特效，选中它
-                    self.effect_tree_widget.selection_set(child)
-                    self.effect_tree_widget.see(child)  # 确保可见
-                    return True
-                # 递归搜索子项
-                if find_and_select(child):
-                    return True
-            return False
+        """在树形控件中选中指定的特效，特效节点尚未插入时先展开分类并插入到该特效为止"""
+        item = self.tree_effect_items.get(effect_path)
+        if item is None:
+            relative_path = os.path.relpath(effect_path, self.current_base_dir)
+            branch = self.tree_branches.get(os.path.dirname(relative_path) or "根目录")
+            if branch is None:
+                return  # 被筛选掉的特效
+            index = next((i for i, e in enumerate(branch.effects) if e['path'] == effect_path), None)
+            if index is None:
+                return
+            if branch.node:
+                self.effect_tree_widget.item(branch.node, open=True)
+                self.tree_open_categories.add(branch.category)
+            # 按整批插入，保证之后的特效同样按批插入
+            chunks = (index - branch.materialized) // TREE_CHUNK_SIZE + 1
+            self._materialize_branch(branch, chunks * TREE_CHUNK_SIZE)
+            item = self.tree_effect_items[effect_path]
+        
+        self.effect_tree_widget.selection_set(item)
+        self.effect_tree_widget.see(item)  # 确保可见
+    
+    def open_contact_sheet(self):
+        """以网格方式预览选中分类（或选中特效所在分类）下的所有特效"""
+        selection = self.effect_tree_widget.selection()
+        category = self._category_of_item(selection[0]) if selection else None
         
-        find_and_select()
+        effects = dict(self._iter_filtered_categories()).get(category) if category is not None else None
+        if not effects:
+            messagebox.showinfo("提示", "请先在特效列表中选择一个分类或特效")
+            return
+        
+        if self.contact_sheet is not None:
+            self.contact_sheet.close()
+        self.contact_sheet = ContactSheet(self, category, effects)
     
     def select_directory(self):
         """选择目录对话框"""
@@ -336,13 +992,19 @@ class EffectPreview:
         
         # 清空当前预览
         self.stop_play()
+        self._cancel_frame_loading()
+        self._cancel_seek()
         self.current_effect = None
         self.current_effect_path = None
         self.frames = []
+        self.current_image_files = []
+        self.timeline_scale.config(to=0)
+        self.timeline_var.set(0)
         self.file_listbox.delete(0, tk.END)
         self.open_dir_button.config(state=tk.DISABLED)
-        self.canvas.delete("all")
+        self._clear_canvas()
         self.preview_title.config(text="选择一个特效进行预览")
+        self.frame_info_text = ""
         self.frame_info.config(text="")
     
     def reset_directory(self):
@@ -353,233 +1015,1049 @@ class EffectPreview:
         
         # 清空当前预览
         self.stop_play()
+        self._cancel_frame_loading()
+        self._cancel_seek()
         self.current_effect = None
         self.current_effect_path = None
         self.frames = []
+        self.current_image_files = []
+        self.timeline_scale.config(to=0)
+        self.timeline_var.set(0)
         self.file_listbox.delete(0, tk.END)
         self.open_dir_button.config(state=tk.DISABLED)
-        self.canvas.delete("all")
+        self._clear_canvas()
         self.preview_title.config(text="选择一个特效进行预览")
+        self.frame_info_text = ""
         self.frame_info.config(text="")
         
+        # 停止正在进行的扫描
+        self._cancel_scan()
+        
         # 清空特效树和相关数据
         self.effect_tree = {}
         self.current_effect_list = []
         self.current_effect_index = -1
         
         # 清空树形控件
-        for item in self.effect_tree_widget.get_children():
-            self.effect_tree_widget.delete(item)
+        self._clear_tree_widget()
         
         # 重置UI状态
         self.init_ui_state()
     
     def on_depth_change(self):
-        """当扫描深度改变时"""
+        """
+        当扫描深度改变时
+        已扫描过的深度直接从内存中的目录节点重新计算，只有更深的层级才需要读取磁盘
+        """
         self.max_scan_depth = self.depth_var.get()
-        self.scan_effects()
+        
+        scanning = self.scan_thread is not None and self.scan_thread.is_alive()
+        if not self.scan_nodes or scanning:
+            self.scan_effects()
+        elif self.max_scan_depth <= self.graph_depth:
+            self._apply_scan_depth()
+        else:
+            # 已知的目录直接复用，只读取新增层级的目录
+            self.scan_effects(known_nodes=self.scan_nodes)
     
-    def scan_effects(self):
-        """扫描当前目录下的所有特效，支持多层分类"""
+    def _apply_scan_depth(self):
+        """按当前扫描深度从目录节点重新计算特效，不访问磁盘"""
+        self.effect_tree = {}
+        for category, effect in self._collect_effects(self.current_base_dir, self.scan_nodes, self.max_scan_depth):
+            if category not in self.effect_tree:
+                self.effect_tree[category] = []
+            self.effect_tree[category].append(effect)
+        self._build_tree()
+    
+    def scan_effects(self, known_nodes=None):
+        """
+        扫描当前目录下的所有特效，支持多层分类
+        扫描在后台线程中进行，结果分批推送到界面线程并逐步加入树形控件
+        known_nodes为已读取过的目录节点，扫描时直接复用
+        """
+        # 使正在进行的扫描失效
+        self._cancel_scan()
+        
         # 清空树形控件
-        for item in self.effect_tree_widget.get_children():
-            self.effect_tree_widget.delete(item)
+        self._clear_tree_widget()
         
         if not self.current_base_dir or not os.path.exists(self.current_base_dir):
-            self.effect_tree_widget.insert("", "end", text="请选择或拖拽文件夹开始扫描")
+            self._show_tree_message("请选择或拖拽文件夹开始扫描")
             self.stats_label.config(text="总计: 0 个特效")
             return
         
         # 显示扫描状态
         self.loading_label.config(text="正在扫描文件夹...")
-        self.effect_tree_widget.insert("", "end", text="正在扫描，请稍候...")
+        self._show_tree_message("正在扫描，请稍候...")
         
         # 重置扫描数据
         self.effect_tree = {}
-        self.scan_progress = {'scanned': 0, 'max_dirs': 500}  # 简化版初始限制500个目录
+        self.current_effect_list = []
         
-        # 使用简单的同步扫描，定期更新界面
-        self.root.after(10, self._start_simple_scan)
+        # 启动后台扫描线程
+        self.scan_job = ScanJob(self.current_base_dir, self.max_scan_depth)
+        self._start_scan_job(known_nodes)
+    
+    def _start_scan_job(self, known_nodes=None):
+        """在后台线程中运行（或继续运行）当前扫描任务"""
+        job = self.scan_job
+        job.time_budget = self._get_scan_time_budget()
+        self.scan_thread = threading.Thread(
+            target=self._scan_worker,
+            args=(job, self._get_scan_worker_count(), known_nodes)
+        )
+        self.scan_thread.daemon = True
+        self.scan_thread.start()
+        
+        self.cancel_scan_button.config(state=tk.NORMAL)
+        self.resume_scan_button.config(state=tk.DISABLED)
+        self.root.after(50, lambda: self._poll_scan_queue(job))
+    
+    def stop_scan(self):
+        """取消扫描，已找到的特效保留显示，之后可以继续扫描"""
+        if self.scan_job is not None and self.scan_thread is not None and self.scan_thread.is_alive():
+            self.scan_job.cancel()
+            self.cancel_scan_button.config(state=tk.DISABLED)
     
-    def _start_simple_scan(self):
-        """开始简单的同步扫描"""
+    def resume_scan(self):
+        """从上次中断的位置继续扫描"""
+        job = self.scan_job
+        if job is None or not job.pending or (self.scan_thread is not None and self.scan_thread.is_alive()):
+            return
+        if job.base_dir != self.current_base_dir or job.max_depth != self.max_scan_depth:
+            return
+        
+        self._stop_watcher()
+        job.resume()
+        self.loading_label.config(text=f"继续扫描... 已处理 {job.scanned} 个文件夹")
+        self._start_scan_job()
+    
+    def _get_scan_worker_count(self):
+        """读取扫描线程数设置"""
+        try:
+            return min(32, max(1, int(self.scan_workers_var.get())))
+        except (tk.TclError, ValueError):
+            return 4
+    
+    def _get_scan_time_budget(self):
+        """读取扫描时间限制（秒），0表示不限制"""
         try:
-            self.loading_label.config(text="正在扫描文件夹...")
-            self.root.update()  # 更新界面
+            return max(0, int(self.scan_budget_var.get()))
+        except (tk.TclError, ValueError):
+            return 30
+    
+    def _cancel_scan(self):
+        """使当前扫描失效，后台线程会在下一个目录处退出"""
+        if self.scan_job is not None:
+            self.scan_job.cancel()
+            self.scan_job = None
+        if self.poster_job is not None:
+            self.poster_job.cancel()
+            self.poster_job = None
+        self._stop_watcher()
+        self.scan_nodes = {}
+        self.graph_depth = 0
+        self.cancel_scan_button.config(state=tk.DISABLED)
+        self.resume_scan_button.config(state=tk.DISABLED)
+    
+    def _scan_worker(self, job, worker_count, known_nodes=None):
+        """
+        后台扫描线程：使用os.scandir遍历目录，并分批把找到的特效推送到界面线程
+        第一层和第二层子目录分发到线程池中并行扫描，适合延迟较高的网络共享目录
+        扫描索引中已有该根目录时，先推送索引中的特效，再按目录修改时间校验，
+        只有修改时间变化的目录才会重新读取
+        known_nodes中的目录节点（本次运行中已读取过）直接使用，不访问磁盘
+        任务被取消或超出时间预算时，未扫描的目录记录在job.pending中，之后可以继续
+        """
+        base_dir = job.base_dir
+        max_depth = job.max_depth
+        lock = threading.Lock()
+        all_done = threading.Condition(lock)
+        state = {'batch': [], 'last_flush': time.monotonic(), 'pending': 0, 'workers': {}}
+        cached_nodes = self.scan_catalog.load(base_dir)
+        nodes = job.nodes  # 本次扫描得到的目录节点（继续扫描时包含之前已读取的目录）
+        changed = {}  # 需要写回索引的目录节点
+        removed = []  # 已被删除的子目录（相对路径）
+        unfinished = []  # 因取消或超时而没有扫描的目录
+        known_nodes = known_nodes or {}
+        resume_entries = job.pending
+        job.pending = []
+        job.start_clock()
+        
+        # 有索引时立即显示索引中的结果，随后在后台校验
+        if not resume_entries:
+            job.preloaded = not known_nodes and bool(cached_nodes) and '' in cached_nodes
+            if job.preloaded:
+                job.cached_effects = self._collect_effects(base_dir, cached_nodes, max_depth)
+                for start in range(0, len(job.cached_effects), 500):
+                    self.scan_queue.put(('batch', job, job.cached_effects[start:start + 500]))
+        preloaded = job.preloaded
+        
+        def flush():
+            # 调用时需持有lock
+            if state['batch']:
+                self.scan_queue.put(('batch', job, state['batch']))
+                state['batch'] = []
+            workers = sorted(state['workers'].items(), key=lambda item: self.natural_sort_key(item[0]))
+            self.scan_queue.put(('progress', job, job.scanned, workers))
+            state['last_flush'] = time.monotonic()
+        
+        def read_node(rel_path, path):
+            known = known_nodes.get(rel_path)
+            if known is not None:
+                with lock:
+                    nodes[rel_path] = known
+                return known
             
-            # 记录扫描开始时间，设置超时机制
-            import time
-            scan_start_time = time.time()
-            max_scan_time = 30  # 最大扫描时间30秒
+            cached = cached_nodes.get(rel_path)
+            node, relisted = self._read_directory_node(path, cached)
+            if node is None:
+                return None
+            with lock:
+                nodes[rel_path] = node
+                if relisted:
+                    changed[rel_path] = node
+                    if cached is not None:
+                        # 记录被删除的子目录，以便清理索引
+                        for name in set(cached['subdirs']) - set(node['subdirs']):
+                            removed.append(os.path.join(rel_path, name) if rel_path else name)
+            return node
+        
+        def submit(rel_path, name, depth, fan_out):
+            with lock:
+                state['pending'] += 1
+            try:
+                pool.submit(run_task, rel_path, name, depth, fan_out)
+            except RuntimeError:
+                # 关闭程序时线程池已经关闭
+                with lock:
+                    state['pending'] -= 1
+                    unfinished.append((rel_path, name, depth, fan_out))
+        
+        def run_task(*args):
+            try:
+                visit(*args)
+            except Exception as e:
+                print(f"扫描过程中出现未知错误 {args[1]}: {e}")
+            finally:
+                with lock:
+                    state['pending'] -= 1
+                    if state['pending'] == 0:
+                        all_done.notify_all()
+        
+        def visit(rel_path, name, depth, fan_out):
+            """处理rel_path下名为name的子目录，fan_out为True时把它的子目录分发到线程池"""
+            if job.should_stop():
+                # 记录下来，继续扫描时从这里开始
+                with lock:
+                    unfinished.append((rel_path, name, depth, fan_out))
+                return
             
-            # 直接扫描，不使用复杂的异步逻辑
-            self._scan_directory_simple(self.current_base_dir, "", 0)
+            worker = threading.current_thread().name
+            with lock:
+                job.scanned += 1
+                state['workers'][worker] = state['workers'].get(worker, 0) + 1
             
-            # 检查是否超时
-            scan_duration = time.time() - scan_start_time
-            if scan_duration > max_scan_time:
-                self.loading_label.config(text="扫描超时，显示已找到的特效")
-            else:
-                self.loading_label.config(text="")
+            child_rel = os.path.join(rel_path, name) if rel_path else name
+            child = read_node(child_rel, os.path.join(base_dir, child_rel))
+            if child is None:
+                return
             
-            # 清空临时显示
-            for item in self.effect_tree_widget.get_children():
-                self.effect_tree_widget.delete(item)
+            if child['frames']:
+                # 这是一个特效文件夹
+                if not preloaded:
+                    with lock:
+                        state['batch'].append(self._make_effect(base_dir, child_rel, child))
+            elif depth + 1 < max_depth:
+                # 继续扫描子目录
+                for grandchild in child['subdirs']:
+                    if fan_out:
+                        submit(child_rel, grandchild, depth + 1, False)
+                    else:
+                        visit(child_rel, grandchild, depth + 1, False)
             
-            # 构建树形结构
-            self._build_tree()
+            # 按数量或时间分批推送，保证界面持续刷新
+            with lock:
+                if len(state['batch']) >= 100 or time.monotonic() - state['last_flush'] >= 0.1:
+                    flush()
+        
+        job.status = 'done'
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, worker_count),
+                                                     thread_name_prefix="scan")
+        job.pool = pool
+        try:
+            if resume_entries:
+                for entry in resume_entries:
+                    submit(*entry)
+            else:
+                root_node = read_node('', base_dir)
+                if root_node is not None and max_depth > 0:
+                    # 第一层子目录各自作为任务，它们的子目录（第二层）再分发为独立任务
+                    for name in root_node['subdirs']:
+                        submit('', name, 0, True)
+            with all_done:
+                while state['pending'] > 0:
+                    all_done.wait()
             
+            if unfinished:
+                job.pending = unfinished
+                job.status = 'cancelled' if job.cancel_event.is_set() else 'timeout'
         except Exception as e:
             print(f"扫描失败: {e}")
-            self.loading_label.config(text="扫描失败")
-            self._build_tree()  # 显示已找到的特效
-    
-    def _scan_directory_simple(self, directory, parent_path, depth):
-        """简单的同步目录扫描"""
-        if depth >= self.max_scan_depth:
-            return
-        
-        # 检查是否超过最大扫描目录数
-        if self.scan_progress['scanned'] >= self.scan_progress['max_dirs']:
-            # 显示提示对话框询问是否继续
-            result = messagebox.askyesno(
-                "扫描限制", 
-                f"已扫描 {self.scan_progress['max_dirs']} 个目录，继续扫描可能会很慢。\n\n是否继续扫描？",
-                icon="question"
-            )
-            if not result:
-                self.loading_label.config(text="扫描已停止，显示已找到的特效")
-                return
-            else:
-                # 用户选择继续，增加限制数量
-                self.scan_progress['max_dirs'] += 1000
-                self.loading_label.config(text=f"继续扫描... 已处理 {self.scan_progress['scanned']} 个文件夹")
+            job.status = 'error'
+        finally:
+            pool.shutdown(wait=False)
         
-        # 检查路径是否为有效目录
-        if not os.path.exists(directory) or not os.path.isdir(directory):
-            return
+        with lock:
+            flush()
+        
+        # 索引中的结果已过期时，用本次扫描的结果替换
+        if preloaded and job.status == 'done':
+            fresh_effects = self._collect_effects(base_dir, nodes, max_depth)
+            if fresh_effects != job.cached_effects:
+                self.scan_queue.put(('reset', job, fresh_effects))
+        
+        # 把变化写回扫描索引
+        if changed or removed:
+            self.scan_catalog.save(base_dir, changed, removed)
         
+        self.scan_queue.put(('done', job))
+    
+    def _read_directory_node(self, path, cached):
+        """
+        读取目录节点，返回(节点, 是否重新读取了目录)
+        目录修改时间与索引一致时直接复用索引中的节点
+        """
         try:
-            items = os.listdir(directory)
-            # 对目录项进行自然排序
-            items.sort(key=self.natural_sort_key)
-            
-            for item in items:
-                item_path = os.path.join(directory, item)
-                
-                # 跳过非目录文件（如ZIP、RAR等压缩文件）
-                if not os.path.exists(item_path) or not os.path.isdir(item_path):
-                    continue
-                
-                # 跳过隐藏文件夹和系统文件夹
-                if item.startswith('.') or item.startswith('$'):
+            mtime = os.stat(path).st_mtime
+        except OSError as e:
+            print(f"扫描目录失败 {path}: {e}")
+            return None, False
+        
+        if cached is not None and cached['mtime'] == mtime:
+            return cached, False
+        
+        image_files, subdirs, size = self._list_directory(path)
+        return {'mtime': mtime, 'subdirs': subdirs, 'frames': image_files, 'size': size}, True
+    
+    def _make_effect(self, base_dir, relative_path, node):
+        """根据目录节点生成(分类, 特效)"""
+        category = os.path.dirname(relative_path) if os.path.dirname(relative_path) else "根目录"
+        return (category, {
+            'name': os.path.basename(relative_path),
+            'path': os.path.join(base_dir, relative_path),
+            'relative_path': relative_path,
+            'image_count': len(node['frames']),
+            'frames': node['frames'],
+            'size': node['size']
+        })
+    
+    def _collect_effects(self, base_dir, nodes, max_depth, start=''):
+        """从目录节点中按扫描深度收集特效，规则与扫描时相同，start为起始目录的相对路径"""
+        effects = []
+        
+        def visit(rel_path, node, depth):
+            for name in node['subdirs']:
+                child_rel = os.path.join(rel_path, name) if rel_path else name
+                child = nodes.get(child_rel)
+                if child is None:
                     continue
+                if child['frames']:
+                    effects.append(self._make_effect(base_dir, child_rel, child))
+                elif depth + 1 < max_depth:
+                    visit(child_rel, child, depth + 1)
+        
+        start_node = nodes.get(start)
+        if start_node is None:
+            return effects
+        depth = len(start.split(os.sep)) if start else 0
+        if start and start_node['frames']:
+            # 起始目录本身就是特效
+            if depth <= max_depth:
+                effects.append(self._make_effect(base_dir, start, start_node))
+            return effects
+        
+        if depth < max_depth:
+            visit(start, start_node, depth)
+        return effects
+    
+    def _list_directory(self, directory):
+        """
+        使用os.scandir读取一次目录，返回(图片文件列表, 子目录名列表, 文件总大小)
+        DirEntry自带文件类型信息，无需再对每一项调用exists/isdir
+        Windows上DirEntry同时带有文件大小，其他平台读取大小需要额外的stat，
+        因此只在Windows上统计大小，其他平台返回None，在选中特效时再计算
+        """
+        image_files = []
+        subdirs = []
+        size = 0 if os.name == 'nt' else None
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = entry.name
+                    try:
+                        if entry.is_dir():
+                            # 跳过隐藏文件夹和系统文件夹
+                            if not (name.startswith('.') or name.startswith('$')):
+                                subdirs.append(name)
+                            continue
+                        if name.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
+                            image_files.append(name)
+                        if size is not None:
+                            size += entry.stat().st_size
+                    except OSError:
+                        continue
+        except (PermissionError, OSError) as e:
+            print(f"扫描目录失败 {directory}: {e}")
+            return [], [], None
+        
+        image_files.sort(key=self.natural_sort_key)
+        subdirs.sort(key=self.natural_sort_key)
+        return image_files, subdirs, size
+    
+    def _poll_scan_queue(self, job):
+        """在界面线程中处理扫描线程推送的结果"""
+        if job is not self.scan_job:
+            return
+        
+        finished = False
+        try:
+            while True:
+                message = self.scan_queue.get_nowait()
+                if message[1] is not self.scan_job:
+                    continue  # 已取消扫描的结果
                 
-                self.scan_progress['scanned'] += 1
-                
-                # 每处理5个文件夹更新一次界面，更频繁地更新防止卡死
-                if self.scan_progress['scanned'] % 5 == 0:
-                    progress_text = f"正在扫描... 已处理 {self.scan_progress['scanned']} 个文件夹"
-                    if self.scan_progress['scanned'] > self.scan_progress['max_dirs'] * 0.8:
-                        progress_text += f" (接近限制 {self.scan_progress['max_dirs']})"
+                kind = message[0]
+                if kind == 'batch':
+                    self._add_scanned_effects(message[2])
+                elif kind == 'reset':
+                    # 索引中的结果已过期，使用重新扫描的结果
+                    self.effect_tree = {}
+                    for category, effect in message[2]:
+                        self.effect_tree.setdefault(category, []).append(effect)
+                    self._build_tree()
+                elif kind == 'progress':
+                    progress_text = f"正在扫描... 已处理 {message[2]} 个文件夹"
+                    remaining = job.remaining_time()
+                    if remaining is not None:
+                        progress_text += f" (剩余 {remaining:.0f} 秒)"
+                    if len(message[3]) > 1:
+                        # 显示每个扫描线程处理的文件夹数
+                        progress_text += " | " + " ".join(f"#{i + 1}:{count}" for i, (_, count) in enumerate(message[3]))
                     self.loading_label.config(text=progress_text)
-                    self.root.update_idletasks()  # 使用update_idletasks而不是update，更轻量
-                
-                # 检查是否包含图片文件
-                image_files = self._get_image_files(item_path)
-                
-                if image_files:
-                    # 这是一个特效文件夹
-                    relative_path = os.path.relpath(item_path, self.current_base_dir)
-                    category = os.path.dirname(relative_path) if os.path.dirname(relative_path) else "根目录"
-                    
-                    if category not in self.effect_tree:
-                        self.effect_tree[category] = []
-                    
-                    self.effect_tree[category].append({
-                        'name': item,
-                        'path': item_path,
-                        'relative_path': relative_path,
-                        'image_count': len(image_files)
-                    })
-                else:
-                    # 继续递归扫描子目录
-                    self._scan_directory_simple(item_path, 
-                                              os.path.join(parent_path, item) if parent_path else item, 
-                                              depth + 1)
+                elif kind == 'done':
+                    finished = True
+                    break
+        except queue.Empty:
+            pass
         
-        except (PermissionError, OSError, NotADirectoryError) as e:
-            print(f"扫描目录失败 {directory}: {e}")
-        except Exception as e:
-            print(f"扫描过程中出现未知错误 {directory}: {e}")
-            # 继续扫描其他目录，不要因为一个错误就停止
+        if finished:
+            self._finish_scan(job)
+        else:
+            self.root.after(50, lambda: self._poll_scan_queue(job))
+    
+    def _finish_scan(self, job):
+        """扫描结束后的界面处理"""
+        self.scan_nodes = job.nodes
+        # 扫描被中断时目录节点不完整，之后改变深度需要重新扫描（已读取的目录会被复用）
+        self.graph_depth = job.max_depth if job.status == 'done' else 0
+        if job.status == 'timeout':
+            self.loading_label.config(text=f"扫描超时（{job.time_budget} 秒），显示已找到的特效，可点击继续扫描")
+        elif job.status == 'cancelled':
+            self.loading_label.config(text="扫描已取消，显示已找到的特效，可点击继续扫描")
+        elif job.status == 'error':
+            self.loading_label.config(text="扫描失败")
+        else:
+            self.loading_label.config(text="")
+        
+        self.cancel_scan_button.config(state=tk.DISABLED)
+        self.resume_scan_button.config(state=tk.NORMAL if job.pending else tk.DISABLED)
+        
+        if self.tree_message_item:
+            # 没有找到特效，或者筛选后没有结果
+            self.effect_tree_widget.delete(self.tree_message_item)
+            self.tree_message_item = None
+            if not self.effect_tree:
+                self._show_tree_message("未找到包含图片的文件夹")
+        
+        # 分批加入的顺序不一定与树中的顺序一致，重新整理特效列表
+        self._rebuild_effect_list()
+        self._update_selection_stats()
+        
+        # 在后台生成缺失或过期的海报
+        self._start_poster_job()
+        
+        if self.watch_var.get():
+            self._start_watcher()
+    
+    def _add_scanned_effects(self, scanned_effects):
+        """把扫描线程推送的一批特效加入特效树和树形控件"""
+        filter_text = self.filter_var.get().lower().strip()
+        fuzzy = bool(self._fuzzy_query())
+        self.effect_index = None
+        stale_branches = {}  # 需要更新占位节点的分类，整批加入后每个分类只更新一次
+        
+        for category, effect in scanned_effects:
+            if category not in self.effect_tree:
+                self.effect_tree[category] = []
+            self.effect_tree[category].append(effect)
+            
+            if fuzzy:
+                continue  # 模糊搜索的结果按相关度排列，稍后整体重新搜索
+            
+            # 应用筛选
+            if filter_text and filter_text not in EffectIndex.search_text(effect):
+                continue
+            
+            if self.tree_message_item:
+                self.effect_tree_widget.delete(self.tree_message_item)
+                self.tree_message_item = None
+            
+            self._insert_effect_node(category, effect, stale_branches)
+            self.current_effect_list.append(effect)
+        
+        for branch in stale_branches.values():
+            self._update_more_item(branch)
+        
+        if fuzzy and self.filter_after_id is None:
+            self.filter_after_id = self.root.after(150, self._apply_filter)
+        self._update_selection_stats()
+    
+    def _insert_effect_node(self, category, effect, stale_branches=None):
+        """
+        按自然排序把特效加入分类，需要时创建分类节点
+        位置在已插入的节点之间时直接插入树形控件，否则只更新占位节点，
+        stale_branches不为None时不立即更新，而是把分类记录在其中由调用者统一更新
+        """
+        branch = self.tree_branches.get(category)
+        if branch is None:
+            branch = self._create_branch(category)
+        
+        index = branch.add(effect)
+        if index < branch.materialized:
+            self._insert_branch_item(branch, index)
+            branch.materialized += 1
+        elif stale_branches is not None:
+            stale_branches[category] = branch
+        else:
+            self._update_more_item(branch)
+    
+    def _remove_effect_node(self, category, effect):
+        """从特效树和树形控件中移除一个特效，分类为空时一并移除分类节点"""
+        effects = self.effect_tree.get(category, [])
+        if effect in effects:
+            effects.remove(effect)
+        if not effects:
+            self.effect_tree.pop(category, None)
+        
+        self.effect_index = None
+        
+        branch = self.tree_branches.get(category)
+        if branch is None or branch.remove(effect) is None:
+            return  # 被筛选掉的特效不在树形控件中
+        
+        item = self.tree_effect_items.pop(effect['path'], None)
+        if item is not None:
+            self._delete_tree_item(branch.node, item)
+            branch.materialized -= 1
+        self._update_more_item(branch)
+        
+        if not branch.effects:
+            self._remove_branch(category)
+    
+    def _create_branch(self, category, effects=(), expand=False):
+        """创建分类的TreeBranch，按排序插入分类节点，根目录的特效直接放在根级别"""
+        if category == "根目录":
+            node = ""
+        else:
+            index = self._sorted_insert_index("", (self.natural_sort_key(category), []))
+            node = self.effect_tree_widget.insert("", index, text=f"📁 {category}", values=("category",),
+                                                  open=expand or category in self.tree_open_categories)
+            self.tree_category_nodes[category] = node
+            if expand:
+                self.tree_filter_open.add(category)
+        branch = TreeBranch(category, node, self.natural_sort_key, effects)
+        self.tree_branches[category] = branch
+        return branch
+    
+    def _show_branch(self, branch, expand=False):
+        """展开的分类（和根目录）插入第一批特效，折叠的分类只显示占位节点"""
+        if not branch.node or expand or branch.category in self.tree_open_categories:
+            self._materialize_branch(branch)
+        else:
+            self._update_more_item(branch)
+    
+    def _update_branch(self, branch, effects, expand=False):
+        """把分类中的特效换成新的筛选结果，只删除和插入发生变化的节点"""
+        is_open = True
+        if branch.node:
+            is_open = expand or branch.category in self.tree_open_categories
+            self.effect_tree_widget.item(branch.node, open=is_open)
+            if expand:
+                self.tree_filter_open.add(branch.category)
+            else:
+                self.tree_filter_open.discard(branch.category)
+        count = min(len(effects), max(branch.materialized, TREE_CHUNK_SIZE)) if is_open else 0
+        
+        keep = {effect['path'] for effect in effects[:count]}
+        for effect in branch.effects[:branch.materialized]:
+            if effect['path'] not in keep:
+                self._delete_tree_item(branch.node, self.tree_effect_items.pop(effect['path']))
+        
+        # 新旧结果的顺序一致，按顺序补上缺少的节点
+        branch.effects = list(effects)
+        branch.keys = None
+        for index in range(count):
+            if effects[index]['path'] not in self.tree_effect_items:
+                self._insert_branch_item(branch, index)
+        branch.materialized = count
+        self._update_more_item(branch)
+    
+    def _remove_branch(self, category):
+        """从树形控件中移除分类及其已插入的特效节点"""
+        branch = self.tree_branches.pop(category)
+        self.tree_filter_open.discard(category)
+        for effect in branch.effects[:branch.materialized]:
+            item = self.tree_effect_items.pop(effect['path'], None)
+            if item is not None and not branch.node:
+                self._delete_tree_item(branch.node, item)
+        if branch.node:
+            self._delete_tree_item("", branch.node)
+            self.tree_category_nodes.pop(category, None)
+        elif branch.more_item is not None:
+            self._delete_tree_item(branch.node, branch.more_item)
+    
+    def _delete_tree_item(self, parent, item):
+        """删除树节点，根级别的节点同时删除记录的排序键"""
+        if not parent:
+            del self.tree_child_keys[""][self.effect_tree_widget.index(item)]
+        self.effect_tree_widget.delete(item)
+    
+    def _insert_branch_item(self, branch, index):
+        """把分类中第index个特效插入树形控件，调用前index之前的特效都已插入"""
+        effect = branch.effects[index]
+        if branch.node:
+            position = index  # 分类节点下已插入的特效排在占位节点之前
+        else:
+            # 根目录的特效和分类节点混排
+            key = (self.natural_sort_key(branch.category), self.natural_sort_key(effect['name']))
+            position = self._sorted_insert_index("", key)
+        display_name = f"🎬 {effect['name']} ({effect['image_count']}帧)"
+        item = self.effect_tree_widget.insert(branch.node, position, text=display_name,
+                                              values=("effect", effect['relative_path'], effect['path']))
+        self.tree_effect_items[effect['path']] = item
+        return item
+    
+    def _materialize_branch(self, branch, count=TREE_CHUNK_SIZE):
+        """按顺序插入分类中接下来的count个特效"""
+        end = min(len(branch.effects), branch.materialized + count)
+        for index in range(branch.materialized, end):
+            self._insert_branch_item(branch, index)
+        branch.materialized = max(branch.materialized, end)
+        self._update_more_item(branch)
+    
+    def _update_more_item(self, branch):
+        """更新分类末尾的占位节点，没有尚未插入的特效时删除"""
+        if branch.remaining <= 0:
+            if branch.more_item is not None:
+                self._delete_tree_item(branch.node, branch.more_item)
+                branch.more_item = None
+            return
+        
+        text = f"… 还有 {branch.remaining} 个特效"
+        if branch.more_item is not None:
+            self.effect_tree_widget.item(branch.more_item, text=text)
+            return
+        if branch.node:
+            position = "end"
+        else:
+            position = self._sorted_insert_index("", (self.natural_sort_key(branch.category), TreeBranch.MORE_KEY))
+        branch.more_item = self.effect_tree_widget.insert(branch.node, position, text=text,
+                                                          values=("more", branch.category))
+    
+    def _category_of_item(self, item):
+        """树节点所属的分类，分类节点、特效节点和占位节点都返回分类名称"""
+        values = self.effect_tree_widget.item(item, "values")
+        if values and values[0] == "effect":
+            return os.path.dirname(values[1]) or "根目录"
+        if values and values[0] == "more":
+            return values[1]
+        for name, node in self.tree_category_nodes.items():
+            if node == item:
+                return name
+        return None
+    
+    def on_tree_open(self, event):
+        """展开分类时插入第一批特效"""
+        category = self._category_of_item(self.effect_tree_widget.focus())
+        branch = self.tree_branches.get(category)
+        if branch is None or not branch.node:
+            return
+        self.tree_open_categories.add(category)
+        if branch.materialized == 0:
+            self._materialize_branch(branch)
+    
+    def on_tree_close(self, event):
+        category = self._category_of_item(self.effect_tree_widget.focus())
+        self.tree_open_categories.discard(category)
+        self.tree_filter_open.discard(category)
+    
+    def on_tree_scroll(self, first, last):
+        """树形控件滚动或内容变化后，检查占位节点是否滚动到了可见区域"""
+        self.tree_scrollbar.set(first, last)
+        if self.tree_check_after_id is None:
+            self.tree_check_after_id = self.root.after_idle(self._materialize_visible_branches)
+    
+    def _materialize_visible_branches(self):
+        """
+        可见的占位节点换成下一批特效
+        折叠分类的占位节点不可能可见，只检查根目录、展开的分类和筛选时自动展开的分类
+        """
+        self.tree_check_after_id = None
+        categories = {"根目录"} | self.tree_open_categories | self.tree_filter_open
+        for category in categories:
+            branch = self.tree_branches.get(category)
+            if branch is not None and branch.more_item is not None and self.effect_tree_widget.bbox(branch.more_item):
+                self._materialize_branch(branch)
+    
+    def _sorted_insert_index(self, parent, key):
+        """记录排序键并返回在父节点下应插入的位置"""
+        keys = self.tree_child_keys.setdefault(parent, [])
+        index = bisect.bisect_right(keys, key)
+        keys.insert(index, key)
+        return index
+    
+    def _clear_tree_widget(self, keep_index=False):
+        """清空树形控件及其节点索引，特效树可能已经变化，除非keep_index为True，之后重新建立筛选索引"""
+        for item in self.effect_tree_widget.get_children():
+            self.effect_tree_widget.delete(item)
+        self.tree_category_nodes = {}
+        self.tree_child_keys = {}
+        self.tree_effect_items = {}
+        self.tree_branches = {}
+        self.tree_filter_open = set()
+        self.tree_message_item = None
+        self.tree_flat = False
+        if not keep_index:
+            self.effect_index = None
     
-    def _get_image_files(self, directory):
-        """获取目录中的图片文件"""
+    def _show_tree_message(self, text):
+        """在树形控件中显示一条提示"""
+        self.tree_message_item = self.effect_tree_widget.insert("", "end", text=text)
+    
+    def on_watch_change(self):
+        """当监视目录变化选项改变时"""
+        if self.watch_var.get():
+            # 扫描进行中时会在扫描结束后自动开始监视
+            if self.scan_nodes and not (self.scan_thread is not None and self.scan_thread.is_alive()):
+                self._start_watcher()
+        else:
+            self._stop_watcher()
+            self.loading_label.config(text="")
+    
+    def _start_watcher(self):
+        """根据最近一次扫描的目录开始监视当前目录"""
+        self._stop_watcher()
+        if not self.current_base_dir or not self.scan_nodes:
+            return
+        
+        directories = {os.path.join(self.current_base_dir, rel_path): node['mtime']
+                       for rel_path, node in self.scan_nodes.items()}
+        self.watch_queue = queue.Queue()
+        self.dir_watcher = DirectoryWatcher(directories, self.watch_queue)
+        self.dir_watcher.start()
+        self.loading_label.config(text=f"正在监视目录变化（{self.dir_watcher.backend}，{len(directories)} 个文件夹）")
+        
+        watcher = self.dir_watcher
+        self.root.after(300, lambda: self._poll_watch_queue(watcher))
+    
+    def _stop_watcher(self):
+        """停止目录监视"""
+        if self.dir_watcher is not None:
+            self.dir_watcher.stop()
+            self.dir_watcher = None
+            self.watch_queue = None
+    
+    def _poll_watch_queue(self, watcher):
+        """合并监视线程报告的目录变化，并逐个应用到特效树"""
+        if watcher is not self.dir_watcher:
+            return
+        
+        changed = set()
+        try:
+            while True:
+                changed.add(self.watch_queue.get_nowait())
+        except queue.Empty:
+            pass
+        
+        if changed:
+            # 先处理上层目录，下层目录的变化可能已经一并处理
+            for path in sorted(changed, key=len):
+                try:
+                    self._apply_directory_change(path)
+                except Exception as e:
+                    print(f"应用目录变化失败 {path}: {e}")
+        
+        self.root.after(300, lambda: self._poll_watch_queue(watcher))
+    
+    def _apply_directory_change(self, path):
+        """把一个目录的变化应用到特效树和树形控件，不重新扫描整个根目录"""
+        base_dir = self.current_base_dir
+        rel_path = os.path.relpath(path, base_dir)
+        if rel_path == os.curdir:
+            rel_path = ''
+        if rel_path not in self.scan_nodes:
+            return  # 不在扫描范围内，或者已经随上层目录一起处理过
+        
+        depth = len(rel_path.split(os.sep)) if rel_path else 0
+        changed = {}
+        removed = []
+        self._refresh_node(rel_path, path, depth, changed, removed)
+        if not changed and not removed:
+            return
+        
+        # 同步更新扫描索引
+        self.scan_catalog.save(base_dir, changed, removed)
+        
+        # 重新计算受影响目录下的特效并更新树形控件
+        self._patch_effects(rel_path)
+    
+    def _refresh_node(self, rel_path, path, depth, changed, removed):
+        """重新读取一个目录节点，新出现的子目录一并读取，消失的子目录从节点中移除"""
+        old_node = self.scan_nodes.get(rel_path)
+        if not os.path.isdir(path):
+            if old_node is not None:
+                self._drop_nodes(rel_path)
+                removed.append(rel_path)
+            return
+        
+        node, _ = self._read_directory_node(path, None)
+        if node is None or node == old_node:
+            return
+        
+        self.scan_nodes[rel_path] = node
+        changed[rel_path] = node
+        
+        # 移除已删除的子目录
+        old_subdirs = set(old_node['subdirs']) if old_node else set()
+        for name in old_subdirs - set(node['subdirs']):
+            child_rel = os.path.join(rel_path, name) if rel_path else name
+            self._drop_nodes(child_rel)
+            removed.append(child_rel)
+        
+        if rel_path and node['frames']:
+            # 目录变成了特效，不再关心其中的子目录
+            for name in old_subdirs & set(node['subdirs']):
+                child_rel = os.path.join(rel_path, name)
+                if child_rel in self.scan_nodes:
+                    self._drop_nodes(child_rel)
+                    removed.append(child_rel)
+        elif depth < max(self.max_scan_depth, self.graph_depth):
+            # 读取新出现的子目录
+            for name in node['subdirs']:
+                child_rel = os.path.join(rel_path, name) if rel_path else name
+                if child_rel not in self.scan_nodes:
+                    child_path = os.path.join(path, name)
+                    self._refresh_node(child_rel, child_path, depth + 1, changed, removed)
+                    if child_rel in self.scan_nodes and self.dir_watcher is not None:
+                        self.dir_watcher.add_directory(child_path, self.scan_nodes[child_rel]['mtime'])
+    
+    def _drop_nodes(self, rel_path):
+        """从目录节点中移除一个目录及其下的所有目录"""
+        prefix = rel_path + os.sep
+        for key in [k for k in self.scan_nodes if k == rel_path or k.startswith(prefix)]:
+            del self.scan_nodes[key]
+            if self.dir_watcher is not None:
+                self.dir_watcher.remove_directory(os.path.join(self.current_base_dir, key))
+    
+    def _patch_effects(self, rel_path):
+        """对比目录下新旧特效，只更新发生变化的树节点"""
+        prefix = rel_path + os.sep if rel_path else ''
+        old_effects = {}
+        for category, effects in self.effect_tree.items():
+            for effect in effects:
+                if not prefix or effect['relative_path'] == rel_path or effect['relative_path'].startswith(prefix):
+                    old_effects[effect['relative_path']] = (category, effect)
+        
+        new_effects = {}
+        if rel_path in self.scan_nodes:
+            for category, effect in self._collect_effects(self.current_base_dir, self.scan_nodes,
+                                                          self.max_scan_depth, rel_path):
+                new_effects[effect['relative_path']] = (category, effect)
+        
+        # 删除消失的特效
+        for relative_path in set(old_effects) - set(new_effects):
+            self._remove_effect_node(*old_effects[relative_path])
+        
+        # 加入新特效，更新序列帧发生变化的特效
+        added = []
+        reload_current = False
+        for relative_path, (category, effect) in new_effects.items():
+            old = old_effects.get(relative_path)
+            if old is None:
+                added.append((category, effect))
+            elif old[1]['frames'] != effect['frames']:
+                old[1].update(effect)
+                item = self.tree_effect_items.get(effect['path'])
+                if item is not None:
+                    self.effect_tree_widget.item(item, text=f"🎬 {effect['name']} ({effect['image_count']}帧)")
+                if effect['path'] == self.current_effect_path:
+                    reload_current = True
+        if added:
+            self._add_scanned_effects(added)
+        
+        if self.tree_message_item and self.effect_tree:
+            self.effect_tree_widget.delete(self.tree_message_item)
+            self.tree_message_item = None
+        elif not self.effect_tree and not self.tree_message_item:
+            self._show_tree_message("未找到包含图片的文件夹")
+        
+        self._rebuild_effect_list()
+        self._update_selection_stats()
+        
+        if reload_current:
+            self._reload_current_effect()
+    
+    def _reload_current_effect(self):
+        """当前特效的文件夹发生变化时重新加载序列帧，正在加载时等加载完成后再重新加载"""
+        if self.is_loading:
+            self.reload_pending_path = self.current_effect_path
+            return
+        was_playing = self.is_playing
+        self.load_effect_by_path(self.current_effect_path, self.current_effect)
+        if was_playing:
+            self._play_when_ready()
+    
+    def _get_image_files(self, directory, preview=None):
+        """获取目录中的图片文件，不压缩的预览容器完整且比文件夹新时直接使用容器中的帧列表"""
+        if preview is not None:
+            image_files = preview.current_files()
+            if image_files:
+                return image_files
         try:
             if not os.path.exists(directory) or not os.path.isdir(directory):
                 return []
             
             files = os.listdir(directory)
-            image_files = [f for f in files 
+            image_files = [f for f in files
                           if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))]
             return sorted(image_files, key=self.natural_sort_key)
         except (OSError, PermissionError, NotADirectoryError):
             return []
     
+    def _iter_filtered_categories(self):
+        """按排序顺序返回[(分类, 筛选后的特效列表)]，模糊搜索时为最相关的结果"""
+        index = self._get_effect_index()
+        query = self._fuzzy_query()
+        if query:
+            ranked, _ = index.fuzzy(query)
+            return index.group(sorted(ranked))
+        return index.group(index.filter(self.filter_var.get().lower().strip()))
+    
+    def _fuzzy_query(self):
+        """模糊搜索打开且输入了筛选文字时返回去掉空白的查询，否则返回空字符串"""
+        if not self.fuzzy_var.get():
+            return ""
+        return "".join(self.filter_var.get().replace("\\", "/").lower().split())
+    
+    def _get_effect_index(self):
+        """返回特效筛选索引，特效树变化后重新建立"""
+        if self.effect_index is None:
+            self.effect_index = EffectIndex(self.effect_tree, self.natural_sort_key)
+            # 三字母组合和模糊搜索的位图索引在后台建立，完成前按顺序查找
+            self.decode_pool.submit(self.effect_index.build_grams)
+            self.decode_pool.submit(self.effect_index.build_fuzzy)
+        return self.effect_index
+    
+    def _should_expand_all(self):
+        """筛选结果较少时展开所有分类"""
+        return bool(self.filter_var.get().strip()) and len(self.current_effect_list) <= TREE_CHUNK_SIZE
+    
+    def _rebuild_effect_list(self):
+        """按树中的顺序重建当前特效列表（用于自动播放下一个）"""
+        if self.effect_tree and self._fuzzy_query():
+            # 模糊搜索的结果随特效树变化重新搜索
+            self._show_fuzzy_results()
+            return
+        self.current_effect_list = []
+        for category, effects in self._iter_filtered_categories():
+            self.current_effect_list.extend(effects)
+        
+        self._locate_current_effect()
+    
+    def _locate_current_effect(self):
+        """列表顺序可能变化，重新定位当前特效的索引"""
+        if self.current_effect_path:
+            self.current_effect_index = -1
+            for i, effect in enumerate(self.current_effect_list):
+                if effect['path'] == self.current_effect_path:
+                    self.current_effect_index = i
+                    break
+    
     def _build_tree(self):
         """构建树形结构"""
         # 清空树形控件
-        for item in self.effect_tree_widget.get_children():
-            self.effect_tree_widget.delete(item)
+        self._clear_tree_widget()
         
         if not self.effect_tree:
-            self.effect_tree_widget.insert("", "end", text="未找到包含图片的文件夹")
+            if self.scan_thread is not None and self.scan_thread.is_alive():
+                self._show_tree_message("正在扫描，请稍候...")
+            else:
+                self._show_tree_message("未找到包含图片的文件夹")
+            self.stats_label.config(text="总计: 0 个特效")
             return
         
-        # 获取筛选条件
-        filter_text = self.filter_var.get().lower().strip()
+        if self._fuzzy_query():
+            self._show_fuzzy_results()
+            return
         
-        # 重建当前特效列表（用于自动播放下一个）
-        self.current_effect_list = []
+        # 重建当前特效列表（用于自动播放下一个），与树形控件中已插入的节点无关
+        filtered = self._iter_filtered_categories()
+        self.current_effect_list = [effect for _, effects in filtered for effect in effects]
         
-        # 对分类进行排序
-        categories = sorted(self.effect_tree.keys(), key=self.natural_sort_key)
+        # 筛选结果较少时展开所有分类，否则只展开之前展开过的分类
+        expand_all = self._should_expand_all()
         
-        for category in categories:
-            # 对该分类下的特效进行排序和筛选
-            effects = sorted(self.effect_tree[category], key=lambda x: self.natural_sort_key(x['name']))
-            
-            # 应用筛选
-            if filter_text:
-                effects = [e for e in effects if filter_text in e['name'].lower()]
-            
-            if not effects:
-                continue  # 如果该分类下没有符合条件的特效，跳过
-            
-            # 添加到当前特效列表
-            self.current_effect_list.extend(effects)
-            
-            # 创建分类节点
-            if category == "根目录":
-                category_node = ""  # 根目录的特效直接放在根级别
-            else:
-                category_node = self.effect_tree_widget.insert("", "end", text=f"📁 {category}", 
-                                                              values=("category",), open=True)
-            
-            for effect in effects:
-                display_name = f"🎬 {effect['name']} ({effect['image_count']}帧)"
-                parent = category_node if category_node else ""
-                self.effect_tree_widget.insert(parent, "end", text=display_name, 
-                                              values=("effect", effect['relative_path'], effect['path']))
+        for category, effects in filtered:
+            # 分类下的特效只插入展开的分类中的第一批
+            branch = self._create_branch(category, effects, expand_all)
+            self._show_branch(branch, expand_all)
         
         # 更新统计信息
         total_effects = len(self.current_effect_list)
         self.stats_label.config(text=f"总计: {total_effects} 个特效")
+        self._locate_current_effect()
         
         # 更新当前选择信息
         self._update_selection_stats()
     
+    def _show_fuzzy_results(self):
+        """模糊搜索时不分分类，按相关度平铺显示最相关的特效，特效名称后面注明分类"""
+        self._clear_tree_widget(keep_index=True)
+        self.tree_flat = True
+        index = self._get_effect_index()
+        ranked, total = index.fuzzy(self._fuzzy_query())
+        
+        self.current_effect_list = []
+        for i in ranked:
+            effect = index.effects[i]
+            category = index.categories[index.category_of[i]]
+            display_name = f"🎬 {effect['name']} ({effect['image_count']}帧)"
+            if category != "根目录":
+                display_name += f"  - {category}"
+            item = self.effect_tree_widget.insert("", "end", text=display_name,
+                                                  values=("effect", effect['relative_path'], effect['path']))
+            self.tree_effect_items[effect['path']] = item
+            self.current_effect_list.append(effect)
+        
+        if not ranked:
+            self.effect_tree_widget.insert("", "end", text="没有匹配的特效")
+        elif total > len(ranked):
+            self.effect_tree_widget.insert("", "end", text=f"共 {total} 个匹配，只显示最相关的 {len(ranked)} 个")
+        
+        self._locate_current_effect()
+        self._update_selection_stats()
+    
     def _update_selection_stats(self):
         """更新当前选择的统计信息"""
         if self.current_effect_index >= 0 and self.current_effect_list:
@@ -602,11 +2080,28 @@ class EffectPreview:
             display_path = relative_path
         self.effect_path_label.config(text=display_path)
         
-        # 显示统计信息
-        file_size = self._get_directory_size(effect_path)
+        # 显示统计信息，优先使用扫描索引中记录的大小
+        effect = self._find_effect(effect_path)
+        file_size = effect.get('size') if effect else None
+        if file_size is None:
+            file_size = self._get_directory_size(effect_path)
+            if effect:
+                effect['size'] = file_size
+                node = self.scan_nodes.get(effect['relative_path'])
+                if node is not None:
+                    node['size'] = file_size
+                self.scan_catalog.update_size(self.current_base_dir, effect['relative_path'], file_size)
         size_text = self._format_file_size(file_size)
         self.effect_stats_label.config(text=f"帧数: {image_count} | 大小: {size_text}")
     
+    def _find_effect(self, effect_path):
+        """根据完整路径查找特效"""
+        for effects in self.effect_tree.values():
+            for effect in effects:
+                if effect['path'] == effect_path:
+                    return effect
+        return None
+    
     def _get_directory_size(self, directory):
         """获取目录大小"""
         total_size = 0
@@ -642,10 +2137,21 @@ class EffectPreview:
             item = selection[0]
             values = self.effect_tree_widget.item(item, "values")
             
+            # 选中占位节点时插入下一批特效，并选中其中的第一个
+            if values and values[0] == "more":
+                branch = self.tree_branches.get(values[1])
+                if branch is not None and branch.remaining > 0:
+                    first = branch.effects[branch.materialized]
+                    self._materialize_branch(branch)
+                    self.effect_tree_widget.selection_set(self.tree_effect_items[first['path']])
+                return
+            
             # 只有特效项才能播放，分类项不能播放
             if values and len(values) >= 3 and values[0] == "effect":
                 effect_path = values[2]  # 完整路径
                 effect_name = os.path.basename(effect_path)
+                keyboard = self.tree_key_browsing
+                self.tree_key_browsing = False
                 
                 # 只有在非自动播放时才更新索引
                 if not self.is_auto_playing_next:
@@ -662,26 +2168,67 @@ class EffectPreview:
                 # 更新选择统计
                 self._update_selection_stats()
                 
-                self.load_effect_by_path(effect_path, effect_name)
-                
-                # 如果启用自动播放，则自动开始播放
-                if self.auto_play_var.get():
-                    self.root.after(100, self.start_play)  # 延迟100ms开始播放
+                if self.select_after_id is not None:
+                    self.root.after_cancel(self.select_after_id)
+                    self.select_after_id = None
+                if keyboard:
+                    # 用方向键快速浏览时先显示海报，停留250ms后才加载，只解码最终停下的特效
+                    if effect_path != self.current_effect_path:
+                        if self.is_playing:
+                            self.pause_play()
+                        self._show_poster(effect_path)
+                    self.select_after_id = self.root.after(
+                        250, lambda: self._load_selected_effect(effect_path, effect_name))
+                else:
+                    self._load_selected_effect(effect_path, effect_name)
+    
+    def on_tree_key(self, event):
+        """键盘操作引起的选择变化延迟加载"""
+        self.tree_key_browsing = True
+    
+    def on_tree_click(self, event):
+        self.tree_key_browsing = False
+    
+    def _load_selected_effect(self, effect_path, effect_name):
+        """加载树中选中的特效"""
+        self.select_after_id = None
+        # 自动播放下一个时已经直接加载了该特效，选中事件不再重复加载
+        if effect_path != self.current_effect_path:
+            self.load_effect_by_path(effect_path, effect_name)
+        
+        # 如果启用自动播放，则自动开始播放
+        if self.auto_play_var.get():
+            self._play_when_ready()
     
     def load_effect_by_path(self, effect_path, effect_name):
-        """通过完整路径加载特效序列帧"""
-        if self.is_loading:
-            return  # 如果正在加载，忽略新的加载请求
+        """通过完整路径加载特效序列帧，正在加载其他特效时以最新的请求为准"""
+        job = self.frame_load_job
+        if job is not None:
+            if job.effect_path == effect_path:
+                return  # 该特效已经在加载
+            # 取消正在进行的加载，已经解码的帧仍保留在帧缓存中，再次选择时不需要重新解码
+            job.cancel()
+            self.frame_load_job = None
+            self.is_loading = False
         
         self.stop_play()
+        self.play_when_ready = False
+        self._cancel_rerender()
+        self._cancel_seek()
         
         if not os.path.exists(effect_path):
             return
         
-        # 获取所有图片文件并使用自然排序
-        image_files = self._get_image_files(effect_path)
+        # 预读尚未完成的特效改由前台加载，预读任务不再写它的预览容器
+        if self.prefetch_job is not None:
+            self.prefetch_job.release(effect_path)
+        
+        # 获取所有图片文件并使用自然排序（预览容器比文件夹新时直接使用容器中的帧列表）
+        preview = self._open_preview_session(effect_path, self._get_render_target())
+        image_files = self._get_image_files(effect_path, preview)
         
         if not image_files:
+            preview.discard()
             return
         
         # 更新特效信息显示
@@ -693,7 +2240,11 @@ class EffectPreview:
         
         self.current_effect = effect_name
         self.current_effect_path = effect_path
-        self.frames = []
+        self.frames = FrameSequence(len(image_files), self._get_resident_window())
+        self.total_frames = len(image_files)
+        self.current_image_files = image_files
+        self.timeline_scale.config(to=len(image_files) - 1)
+        self.timeline_var.set(0)
         
         # 更新文件列表
         self.file_listbox.delete(0, tk.END)
@@ -703,72 +2254,511 @@ class EffectPreview:
         # 启用打开目录按钮
         self.open_dir_button.config(state=tk.NORMAL)
         
-        # 异步加载帧
+        # 异步加载帧，加载第一帧期间先显示海报
         self.preview_title.config(text=f"特效: {effect_name} ({len(image_files)} 帧)")
-        self._load_frames_async(image_files, 0)
+        self._show_poster(effect_path)
+        self._load_frames_async(image_files, preview)
     
-    def _load_frames_async(self, image_files, index):
-        """异步加载帧，避免界面假死"""
-        if index >= len(image_files):
-            # 加载完成
-            self.is_loading = False
-            self.loading_label.config(text="")
-            
-            if self.frames:
-                # 根据反序选项设置起始帧
-                if self.reverse_var.get():
-                    self.current_frame = len(self.frames) - 1  # 反序从最后一帧开始
+    def _get_resident_window(self):
+        """获取常驻PhotoImage的帧数，0为全部常驻"""
+        try:
+            return max(0, int(self.resident_window_var.get()))
+        except (tk.TclError, ValueError):
+            return 0
+    
+    def _get_render_target(self):
+        """返回当前的(最大宽度, 最大高度, 缩放质量)"""
+        quality = "balanced"
+        for name, (label, _, _) in RESIZE_QUALITY_PRESETS.items():
+            if label == self.resize_quality_var.get():
+                quality = name
+        return self.render_size[0], self.render_size[1], quality
+    
+    def _open_preview_session(self, effect_path, target):
+        """打开特效的磁盘预览缓存会话"""
+        codec = "raw" if self.pack_frames_var.get() else "zlib"
+        return PreviewSession(self.preview_cache, effect_path, target, codec)
+    
+    def _load_frames_async(self, image_files, preview=None):
+        """
+        异步加载帧，避免界面假死
+        读取和缩放在解码线程池中进行，界面线程按顺序取回结果，只负责创建PhotoImage
+        """
+        target = preview.target if preview is not None else self._get_render_target()
+        self.frames_target = target
+        if preview is None:
+            preview = self._open_preview_session(self.current_effect_path, target)
+        job = FrameLoadJob(self.current_effect_path, self.current_effect, image_files, target, self.frames, preview)
+        self.frame_load_job = job
+        self._submit_decode_tasks(job)
+        self.root.after(1, lambda: self._poll_decoded_frames(job))
+    
+    def _submit_decode_tasks(self, job):
+        """提交解码任务，最多领先界面线程一个窗口，避免积压过多解码结果"""
+        window = self.decode_workers * 4
+        while job.next_submit < len(job.image_files) and job.next_submit < job.next_index + window:
+            img_path = os.path.join(job.effect_path, job.image_files[job.next_submit])
+            decode = self._decode_packed_frame if job.frames.windowed else self._decode_frame
+            job.futures[job.next_submit] = self.decode_pool.submit(decode, img_path, job.target, job.preview)
+            job.next_submit += 1
+    
+    def _decode_frame(self, img_path, target, preview=None):
+        """在解码线程中读取一帧并调整大小，依次尝试内存帧缓存和磁盘预览缓存"""
+        max_width, max_height, quality = target
+        name = os.path.basename(img_path)
+        if preview is not None:
+            signature = preview.signature(name, img_path)
+        else:
+            stat = os.stat(img_path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        key = (img_path, signature, target)
+        img = self.frame_cache.get(key)
+        if img is not None:
+            self.perf_metrics.record_frame('memory')
+        elif preview is not None:
+            img = preview.load(name, signature)
+            if img is not None:
+                self.perf_metrics.record_frame('disk')
+                self.frame_cache.put(key, img)
+        if img is None:
+            start = time.perf_counter()
+            img = Image.open(img_path)
+            self.draft_image(img, max_width, max_height, quality)
+            img.load()
+            decoded = time.perf_counter()
+            # 调整图片大小以适应画布
+            img = self.resize_image(img, max_width, max_height, quality)
+            self.perf_metrics.record_frame('decode', decoded - start, time.perf_counter() - decoded)
+            self.frame_cache.put(key, img)
+        if preview is not None:
+            preview.store(name, signature, img)
+        return img
+    
+    def _decode_packed_frame(self, img_path, target, preview=None):
+        """解码一帧并同时生成压缩数据，供常驻窗口之外的帧使用"""
+        img = self._decode_frame(img_path, target, preview)
+        return img, FrameSequence.pack(img)
+    
+    def _poll_decoded_frames(self, job):
+        """在界面线程中按顺序取回解码好的帧"""
+        if job is not self.frame_load_job or job.cancelled:
+            return
+        
+        total = len(job.image_files)
+        first_frame = not self.frames
+        self._collect_decoded_frames(job)
+        
+        if first_frame and self.frames:
+            # 流式加载：第一帧解码完成后立即显示，不等待整个序列（已经定位到其他帧时不切换）
+            job.first_frame_time = time.monotonic()
+            if self.seek_index is None:
+                self.show_frame(0)
+            if self.play_when_ready:
+                self.play_when_ready = False
+                self.start_play()
+        
+        if job.next_index >= total:
+            # 在后台保存磁盘预览缓存
+            self.decode_pool.submit(job.preview.commit, job.image_files)
+            self._record_load(job)
+            self._finish_frame_loading()
+            return
+        
+        # 更新加载进度
+        self.loading_label.config(text=f"正在加载 {job.effect_name}... ({job.next_index}/{total})")
+        self.update_frame_info()
+        self.update_cache_stats()
+        
+        # 继续提交解码任务并等待结果
+        self._submit_decode_tasks(job)
+        self.root.after(5, lambda: self._poll_decoded_frames(job))
+    
+    def _collect_decoded_frames(self, job):
+        """按顺序把已解码完成的帧放入job.frames，每次最多占用界面线程约15ms，保证界面响应"""
+        deadline = time.monotonic() + 0.015
+        total = len(job.image_files)
+        while job.next_index < total:
+            future = job.futures.get(job.next_index)
+            if future is None or not future.done():
+                break
+            del job.futures[job.next_index]
+            try:
+                if job.frames.windowed:
+                    job.frames.append(*future.result())
                 else:
-                    self.current_frame = 0  # 正序从第一帧开始
-                self.show_frame(self.current_frame)
-                self.update_frame_info()
+                    job.frames.append(future.result())
+            except Exception as e:
+                img_path = os.path.join(job.effect_path, job.image_files[job.next_index])
+                print(f"加载图片失败 {img_path}: {e}")
+            job.next_index += 1
+            if time.monotonic() >= deadline:
+                break
+    
+    def _finish_frame_loading(self):
+        """加载完成"""
+        self.frame_load_job = None
+        self.is_loading = False
+        self.loading_label.config(text="")
+        self.update_cache_stats()
+        
+        # 部分帧加载失败时以实际加载的帧数为准
+        self.total_frames = len(self.frames)
+        if self.frames and not self.is_playing:
+            if self.reverse_var.get():
+                # 反序从最后一帧开始，流式加载时最后一帧刚刚才可用
+                self.current_frame = len(self.frames) - 1
+            self.show_frame(min(self.current_frame, len(self.frames) - 1))
+        self.update_frame_info()
+        
+        # 加载期间文件夹发生了变化，加载的帧列表可能已经过期
+        reload_path, self.reload_pending_path = self.reload_pending_path, None
+        if reload_path is not None and reload_path == self.current_effect_path:
+            self._reload_current_effect()
+            return
+        
+        # 加载期间画布尺寸发生了变化
+        if self.frames_target != self._get_render_target():
+            self._rerender_frames()
+        
+        # 当前特效加载完成后开始预读后面的特效
+        self._start_prefetch()
+    
+    def _cancel_frame_loading(self):
+        """取消正在进行的序列帧加载"""
+        if self.frame_load_job is not None:
+            self.frame_load_job.cancel()
+            self.frame_load_job = None
+        if self.prefetch_job is not None:
+            self.prefetch_job.cancel()
+            self.prefetch_job = None
+        self._cancel_rerender()
+        self.is_loading = False
+        self.play_when_ready = False
+        self.reload_pending_path = None
+    
+    def _start_poster_job(self):
+        """在后台为所有特效生成海报，树中靠前的特效优先"""
+        if self.poster_job is not None:
+            self.poster_job.cancel()
+            self.poster_job = None
+        
+        effects = list(self.current_effect_list)
+        listed = {effect['path'] for effect in effects}
+        for category_effects in self.effect_tree.values():
+            effects.extend(effect for effect in category_effects if effect['path'] not in listed)
+        effects = [effect for effect in effects if effect.get('frames')]
+        if not effects:
+            return
+        
+        job = PosterJob(effects, (self.render_size[0], self.render_size[1], "balanced"))
+        self.poster_job = job
+        self._pump_posters(job)
+    
+    def _pump_posters(self, job):
+        """在界面线程中定时提交海报生成任务，前台加载和预读期间暂停提交"""
+        if job is not self.poster_job or job.cancelled:
             return
         
-        # 加载当前帧
-        img_file = image_files[index]
-        img_path = os.path.join(self.current_effect_path, img_file)
+        for future in [f for f in job.futures if f.done()]:
+            effect_path = job.futures.pop(future)
+            try:
+                if future.result():
+                    job.created += 1
+            except Exception as e:
+                print(f"生成海报失败 {effect_path}: {e}")
+        
+        prefetch_job = self.prefetch_job
+        prefetching = prefetch_job is not None and (prefetch_job.pending or prefetch_job.futures)
+        if self.frame_load_job is None and not prefetching:
+            while job.pending and len(job.futures) < self.decode_workers:
+                effect = job.pending.popleft()
+                future = self.decode_pool.submit(self._make_poster, effect, job.target)
+                job.futures[future] = effect['path']
+        
+        if not job.pending and not job.futures:
+            self.poster_job = None
+            if job.created:
+                self.decode_pool.submit(self.poster_cache.save_index)
+            return
+        self.root.after(50, lambda: self._pump_posters(job))
+    
+    def _make_poster(self, effect, target):
+        """在解码线程中生成特效的海报，已有的海报仍然有效时返回False"""
+        frame = PosterCache.poster_frame(effect['frames'])
+        img_path = os.path.join(effect['path'], frame)
+        stat = os.stat(img_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if self.poster_cache.is_valid(effect['path'], frame, signature):
+            return False
+        max_width, max_height, quality = target
+        img = Image.open(img_path)
+        self.draft_image(img, max_width, max_height, quality)
+        img.load()
+        img = self.resize_image(img, max_width, max_height, quality)
+        self.poster_cache.put(effect['path'], frame, signature, img)
+        return True
+    
+    def _show_poster(self, effect_path):
+        """在画布上显示特效的海报，返回是否有海报"""
+        img = self.poster_cache.get(effect_path)
+        if img is None:
+            return False
+        max_width, max_height = self.render_size
+        ratio = min(max_width / img.width, max_height / img.height)
+        if abs(ratio - 1) > 0.05:
+            # 海报按生成时的画布尺寸保存，尺寸相差较大时快速缩放
+            img = img.resize((max(1, int(img.width * ratio)), max(1, int(img.height * ratio))),
+                             Image.Resampling.BILINEAR)
+        self._show_photo(ImageTk.PhotoImage(img))
+        return True
+    
+    def on_tree_motion(self, event):
+        """鼠标在特效上停留时显示海报缩略图"""
+        item = self.effect_tree_widget.identify_row(event.y)
+        if item == self.poster_tip_item:
+            return
+        self.hide_poster_tip()
+        self.poster_tip_item = item
+        values = self.effect_tree_widget.item(item, "values") if item else ()
+        if values and len(values) >= 3 and values[0] == "effect":
+            x, y = event.x_root + 20, event.y_root + 10
+            self.poster_tip_after_id = self.root.after(400, lambda: self._show_poster_tip(values[2], x, y))
+    
+    def _show_poster_tip(self, effect_path, x, y):
+        self.poster_tip_after_id = None
+        img = self.poster_cache.get(effect_path)
+        if img is None:
+            return
+        img = img.copy()
+        img.thumbnail((160, 160))
+        photo = ImageTk.PhotoImage(img)
+        self.poster_tip = tk.Toplevel(self.root)
+        self.poster_tip.wm_overrideredirect(True)
+        self.poster_tip.wm_geometry(f"+{x}+{y}")
+        label = tk.Label(self.poster_tip, image=photo, bg="black", borderwidth=1, relief=tk.SOLID)
+        label.image = photo  # 保持引用
+        label.pack()
+    
+    def hide_poster_tip(self, event=None):
+        """隐藏悬停显示的海报"""
+        if self.poster_tip_after_id is not None:
+            self.root.after_cancel(self.poster_tip_after_id)
+            self.poster_tip_after_id = None
+        if self.poster_tip is not None:
+            self.poster_tip.destroy()
+            self.poster_tip = None
+        self.poster_tip_item = None
+    
+    def _start_prefetch(self):
+        """开启自动播放下一个时，预读播放列表中接下来的几个特效"""
+        if self.prefetch_job is not None:
+            self.prefetch_job.cancel()
+            self.prefetch_job = None
         
+        if not self.auto_next_var.get() or not self.current_effect_list or self.current_effect_index < 0:
+            return
         try:
-            img = Image.open(img_path)
-            # 调整图片大小以适应画布
-            img = self.resize_image(img, 600, 400)
-            photo = ImageTk.PhotoImage(img)
-            self.frames.append(photo)
-        except Exception as e:
-            print(f"加载图片失败 {img_path}: {e}")
+            count = max(0, int(self.prefetch_count_var.get()))
+        except (tk.TclError, ValueError):
+            return
         
-        # 更新加载进度
-        self.loading_label.config(text=f"正在加载 {self.current_effect}... ({index + 1}/{len(image_files)})")
+        effects = []
+        previews = {}
+        target = self._get_render_target()
+        count = min(count, len(self.current_effect_list) - 1)
+        for offset in range(1, count + 1):
+            index = (self.current_effect_index + offset) % len(self.current_effect_list)
+            effect_path = self.current_effect_list[index]['path']
+            preview = self._open_preview_session(effect_path, target)
+            image_files = self._get_image_files(effect_path, preview)
+            if image_files:
+                effects.append((effect_path, image_files))
+                previews[effect_path] = preview
+            else:
+                preview.discard()
+        if not effects:
+            return
+        
+        job = PrefetchJob(effects, target)
+        job.previews = previews
+        self.prefetch_job = job
+        self._pump_prefetch(job)
+    
+    def _pump_prefetch(self, job):
+        """在界面线程中定时提交预读解码任务并统计完成情况"""
+        if job is not self.prefetch_job or job.cancelled:
+            return
+        
+        for future in [f for f in job.futures if f.done()]:
+            effect_path = job.futures.pop(future)
+            if future.exception() is not None:
+                print(f"预读图片失败 {effect_path}: {future.exception()}")
+            if effect_path not in job.remaining:
+                continue  # 已经交给前台加载
+            job.remaining[effect_path] -= 1
+            if job.remaining[effect_path] == 0:
+                self.decode_pool.submit(job.previews.pop(effect_path).commit, job.image_files[effect_path])
+        
+        # 前台加载期间暂停提交，只保持少量预读任务在途
+        if self.frame_load_job is None:
+            while job.pending and len(job.futures) < self.decode_workers:
+                effect_path, img_path = job.pending.popleft()
+                future = self.decode_pool.submit(self._decode_frame, img_path, job.target,
+                                                 job.previews[effect_path])
+                job.futures[future] = effect_path
+        
+        if not job.pending and not job.futures:
+            self.update_cache_stats()
+            return
+        self.root.after(20, lambda: self._pump_prefetch(job))
+    
+    def _play_when_ready(self):
+        """有可播放的帧时立即开始播放，否则等第一帧加载完成后再播放"""
+        if self.frames:
+            self.start_play()
+        elif self.is_loading:
+            self.play_when_ready = True
+    
+    def on_canvas_configure(self, event):
+        """画布大小改变时立即居中当前帧，停止调整一段时间后再按新尺寸重新缩放"""
+        self.canvas_size = (event.width, event.height)
+        if self.canvas_image_item is not None:
+            self.canvas.coords(self.canvas_image_item, event.width // 2, event.height // 2)
+        if self.resize_after_id is not None:
+            self.root.after_cancel(self.resize_after_id)
+        self.resize_after_id = self.root.after(300, self._apply_canvas_size)
+    
+    def _apply_canvas_size(self):
+        """按画布大小更新缩放目标尺寸（取40像素的整数倍，便于复用各尺寸的缓存）"""
+        self.resize_after_id = None
+        width = max(40, self.canvas_size[0] // 40 * 40)
+        height = max(40, self.canvas_size[1] // 40 * 40)
+        if (width, height) == self.render_size:
+            return
+        self.render_size = (width, height)
+        # 正在加载时等加载完成后再重新缩放
+        if not self.is_loading:
+            self._rerender_frames()
+    
+    def _rerender_frames(self):
+        """
+        在后台按新的缩放目标重新生成当前特效的帧，完成前继续显示原来的帧
+        新尺寸的帧从原始图片（或该尺寸的缓存）缩放，放大时也不会基于已缩小的帧
+        """
+        self._cancel_rerender()
+        if not self.frames or not self.current_image_files:
+            return
+        target = self._get_render_target()
+        frames = FrameSequence(len(self.current_image_files), self._get_resident_window())
+        frames.set_playhead(self.current_frame, -1 if self.reverse_var.get() else 1)
+        preview = self._open_preview_session(self.current_effect_path, target)
+        job = FrameLoadJob(self.current_effect_path, self.current_effect, self.current_image_files,
+                           target, frames, preview)
+        self.rerender_job = job
+        self._submit_decode_tasks(job)
+        self.root.after(1, lambda: self._poll_rerendered_frames(job))
+    
+    def _poll_rerendered_frames(self, job):
+        """取回重新缩放的帧，全部完成后替换当前的帧"""
+        if job is not self.rerender_job or job.cancelled:
+            return
         
-        # 每加载5帧更新一次界面，避免界面卡顿
-        if (index + 1) % 5 == 0:
-            self.root.update_idletasks()
+        self._collect_decoded_frames(job)
+        if job.next_index < len(job.image_files):
+            self._submit_decode_tasks(job)
+            self.root.after(5, lambda: self._poll_rerendered_frames(job))
+            return
         
-        # 继续加载下一帧
-        self.root.after(1, lambda: self._load_frames_async(image_files, index + 1))
+        self.rerender_job = None
+        self.decode_pool.submit(job.preview.commit, job.image_files)
+        self.frames = job.frames
+        self.frames_target = job.target
+        self.total_frames = len(self.frames)
+        if self.frames:
+            self.show_frame(min(self.current_frame, len(self.frames) - 1))
+        self.update_cache_stats()
+        # 预读的特效也改用新尺寸
+        self._start_prefetch()
+    
+    def _cancel_rerender(self):
+        """取消正在进行的重新缩放"""
+        if self.rerender_job is not None:
+            self.rerender_job.cancel()
+            self.rerender_job = None
     
-    def resize_image(self, img, max_width, max_height):
-        """调整图片大小保持比例"""
+    def resize_image(self, img, max_width, max_height, quality="best"):
+        """
+        调整图片大小保持比例
+        非最佳质量缩小时，先让JPEG在解码时按1/2、1/4、1/8缩小（draft），
+        再按整数倍快速缩小（reduce），最后做一次小尺寸的重采样
+        """
+        _, gap, resample = RESIZE_QUALITY_PRESETS.get(quality, RESIZE_QUALITY_PRESETS["best"])
         width, height = img.size
         ratio = min(max_width/width, max_height/height)
         new_width = int(width * ratio)
         new_height = int(height * ratio)
-        return img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        if gap is not None and ratio < 1:
+            min_width, min_height = max(1, new_width * gap), max(1, new_height * gap)
+            self.draft_image(img, max_width, max_height, quality)
+            factor = min(img.width // min_width, img.height // min_height)
+            if factor > 1 and img.mode in ("L", "LA", "RGB", "RGBA", "RGBX", "CMYK", "I", "F"):
+                img = img.reduce(factor)
+        return img.resize((new_width, new_height), resample)
+    
+    def draft_image(self, img, max_width, max_height, quality="best"):
+        """让尚未解码的JPEG在解码时直接缩小到不小于缩放质量所需的尺寸，其他格式不受影响"""
+        _, gap, _ = RESIZE_QUALITY_PRESETS.get(quality, RESIZE_QUALITY_PRESETS["best"])
+        ratio = min(max_width/img.width, max_height/img.height)
+        if gap is not None and ratio < 1:
+            img.draft(None, (max(1, int(img.width * ratio) * gap), max(1, int(img.height * ratio) * gap)))
     
     def show_frame(self, frame_index):
-        """显示指定帧"""
+        """显示指定帧，复用画布上同一个图像项，帧信息按屏幕刷新频率节流更新"""
         if 0 <= frame_index < len(self.frames):
-            self.canvas.delete("all")
-            photo = self.frames[frame_index]
-            self.canvas.create_image(300, 200, image=photo)
+            # 只保留播放位置附近的PhotoImage，空闲时提前还原前方的帧
+            if self.frames.windowed:
+                self.frames.set_playhead(frame_index, -1 if self.reverse_var.get() else 1)
+                self.root.after_idle(self.frames.materialize_ahead)
+            self._show_photo(self.frames[frame_index])
+            self.seek_index = None
+            self.seek_shown = None
             self.current_frame = frame_index
-            self.update_frame_info()
+            if self.frame_info_after_id is None:
+                self.frame_info_after_id = self.root.after(16, self._flush_frame_info)
+            if self.is_playing:
+                self._record_shown_frame()
+    
+    def _show_photo(self, photo):
+        """在画布中央显示PhotoImage"""
+        if self.canvas_image_item is None:
+            self.canvas_image_item = self.canvas.create_image(self.canvas_size[0] // 2,
+                                                              self.canvas_size[1] // 2, image=photo)
+        else:
+            self.canvas.itemconfig(self.canvas_image_item, image=photo)
+        self.canvas_photo = photo
+    
+    def _clear_canvas(self):
+        """清空画布"""
+        self.canvas.delete("all")
+        self.canvas_image_item = None
+        self.canvas_photo = None
+        self.hud_item = None
+    
+    def _flush_frame_info(self):
+        self.frame_info_after_id = None
+        self.update_frame_info()
     
     def update_frame_info(self):
         """更新帧信息显示"""
-        if self.frames:
-            info = f"帧: {self.current_frame + 1}/{len(self.frames)}"
-            self.frame_info.config(text=info)
+        if self.frames or self.seek_index is not None:
+            if self.timeline_var.get() != self.current_frame:
+                self.timeline_var.set(self.current_frame)
+            info = f"帧: {self.current_frame + 1}/{self.total_frames}"
+            if len(self.frames) < self.total_frames:
+                info += f" (已加载 {len(self.frames)})"
+            if info != self.frame_info_text:
+                self.frame_info_text = info
+                self.frame_info.config(text=info)
     
     def toggle_play(self):
         """切换播放状态"""
@@ -785,20 +2775,29 @@ class EffectPreview:
         self.is_playing = True
         self.play_button.config(text="暂停")
         
-        if self.play_thread is None or not self.play_thread.is_alive():
-            self.play_thread = threading.Thread(target=self.play_animation)
-            self.play_thread.daemon = True
-            self.play_thread.start()
+        if self.play_after_id is None:
+            self.frames_played = 1  # 当前帧算作本轮播放的第一帧
+            self.frames_dropped = 0
+            self.shown_times.clear()
+            self.play_start_time = time.monotonic()
+            self.play_shown = 0
+            self._reset_play_clock()
+            self.show_frame(self.current_frame)
+            self._schedule_play_tick()
     
     def pause_play(self):
         """暂停播放"""
         self.is_playing = False
         self.play_button.config(text="播放")
+        self._cancel_play_tick()
+        self._record_playback()
     
     def stop_play(self):
         """停止播放"""
         self.is_playing = False
         self.play_button.config(text="播放")
+        self._cancel_play_tick()
+        self._record_playback()
         if self.frames:
             # 根据反序选项设置起始帧
             if self.reverse_var.get():
@@ -807,33 +2806,210 @@ class EffectPreview:
                 self.current_frame = 0  # 正序从第一帧开始
             self.show_frame(self.current_frame)
     
-    def play_animation(self):
-        """播放动画循环"""
-        start_frame = self.current_frame
-        frames_played = 0
+    def _reset_play_clock(self):
+        """以当前时间作为播放时钟的起点"""
+        self.play_clock_start = time.monotonic()
+        self.play_clock_slots = 0
+    
+    def _get_frame_interval(self):
+        return max(0.001, self.speed_var.get())
+    
+    def _schedule_play_tick(self):
+        """在下一帧的目标时间点安排播放定时"""
+        deadline = self.play_clock_start + (self.play_clock_slots + 1) * self._get_frame_interval()
+        delay = max(0, int((deadline - time.monotonic()) * 1000 + 0.5))
+        self.play_after_id = self.root.after(delay, self._play_tick)
+    
+    def _cancel_play_tick(self):
+        if self.play_after_id is not None:
+            self.root.after_cancel(self.play_after_id)
+            self.play_after_id = None
+    
+    def _play_tick(self):
+        """
+        在界面线程中推进播放：按单调时钟计算应当显示的帧，不受渲染耗时影响，
+        渲染落后时跳过来不及显示的帧
+        """
+        self.play_after_id = None
+        if not self.is_playing or not self.frames:
+            return
         
-        while self.is_playing and self.frames:
-            self.root.after(0, lambda: self.show_frame(self.current_frame))
-            
-            # 根据反序选项决定帧的递增方向
-            if self.reverse_var.get():
-                # 反序播放：从最后一帧到第一帧
-                self.current_frame = (self.current_frame - 1) % len(self.frames)
-            else:
-                # 正序播放：从第一帧到最后一帧
-                self.current_frame = (self.current_frame + 1) % len(self.frames)
-            
-            frames_played += 1
-            
+        now = time.monotonic()
+        due_slots = int((now - self.play_clock_start) / self._get_frame_interval())
+        steps = due_slots - self.play_clock_slots
+        total = max(self.total_frames, 1)
+        direction = -1 if self.reverse_var.get() else 1
+        advanced = 0
+        waiting = False
+        for _ in range(max(steps, 0)):
             # 检查是否完成一轮播放（播放了所有帧）
-            if frames_played >= len(self.frames) and self.auto_next_var.get():
-                self.is_playing = False
-                self.play_button.config(text="播放")
-                self.root.after(500, self.play_next_effect)  # 延迟500ms播放下一个
+            if self.frames_played >= self.total_frames and self.auto_next_var.get():
+                self._finish_play_round()
+                return
+            next_frame = (self.current_frame + direction) % total
+            if self.is_loading and next_frame >= len(self.frames):
+                # 追上加载进度时停在已加载的最后一帧，等待后续帧解码完成
+                waiting = True
                 break
-            
-            # 使用速度控制
-            time.sleep(self.speed_var.get())
+            self.current_frame = next_frame % len(self.frames)
+            self.frames_played += 1
+            advanced += 1
+        
+        if waiting:
+            self._reset_play_clock()
+        elif steps > 0:
+            self.play_clock_slots = due_slots
+        if advanced:
+            self.frames_dropped += advanced - 1
+            self.show_frame(self.current_frame)
+        self._schedule_play_tick()
+    
+    def _finish_play_round(self):
+        """播放完一轮后切换到下一个特效"""
+        self.is_playing = False
+        self.play_button.config(text="播放")
+        self._record_playback()
+        next_effect = self.get_next_effect()
+        prefetch_job = self.prefetch_job
+        if next_effect and prefetch_job is not None and prefetch_job.is_ready(next_effect['path']):
+            # 下一个特效已预读完成，直接衔接播放
+            self.play_next_effect()
+        else:
+            self.root.after(500, self.play_next_effect)  # 延迟500ms播放下一个
+    
+    def _record_shown_frame(self):
+        """记录一次帧显示，每隔一段时间更新帧率显示"""
+        now = time.monotonic()
+        self.play_shown += 1
+        self.shown_times.append(now)
+        while self.shown_times and now - self.shown_times[0] > 1.0:
+            self.shown_times.popleft()
+        if now - self.fps_label_time < 0.25:
+            return
+        self.fps_label_time = now
+        self.fps_label.config(text=f"目标: {1 / self._get_frame_interval():.1f} fps | "
+                                   f"实际: {self._get_achieved_fps():.1f} fps | 跳帧: {self.frames_dropped}")
+    
+    def _get_achieved_fps(self):
+        """最近一秒内的实际帧率"""
+        if len(self.shown_times) < 2 or self.shown_times[-1] == self.shown_times[0]:
+            return 0.0
+        return (len(self.shown_times) - 1) / (self.shown_times[-1] - self.shown_times[0])
+    
+    def _record_load(self, job):
+        """记录一次特效加载的性能数据"""
+        first_frame_ms = None
+        if job.first_frame_time is not None:
+            first_frame_ms = round((job.first_frame_time - job.start_time) * 1000, 1)
+        self.perf_metrics.add_record(
+            'load',
+            effect=job.effect_path,
+            frames=len(job.frames),
+            target=f"{job.target[0]}x{job.target[1]} {job.target[2]}",
+            load_ms=round((time.monotonic() - job.start_time) * 1000, 1),
+            first_frame_ms=first_frame_ms,
+            **self.perf_metrics.snapshot()
+        )
+    
+    def _record_playback(self):
+        """播放停止时记录本次播放的目标帧率、平均帧率和跳帧数"""
+        if self.play_start_time is None:
+            return
+        elapsed = time.monotonic() - self.play_start_time
+        self.play_start_time = None
+        if self.play_shown < 2 or elapsed <= 0:
+            return
+        self.perf_metrics.add_record(
+            'playback',
+            effect=self.current_effect_path,
+            frames=self.total_frames,
+            target_fps=round(1 / self._get_frame_interval(), 2),
+            achieved_fps=round(self.play_shown / elapsed, 2),
+            dropped_frames=self.frames_dropped,
+            duration_s=round(elapsed, 2)
+        )
+    
+    def on_hud_toggle(self):
+        """显示或隐藏性能浮层和状态面板"""
+        if self.hud_var.get():
+            self.perf_label.pack(before=self.perf_frame, pady=(0, 5))
+            self._update_perf_hud()
+        else:
+            if self.hud_after_id is not None:
+                self.root.after_cancel(self.hud_after_id)
+                self.hud_after_id = None
+            if self.hud_item is not None:
+                self.canvas.delete(self.hud_item)
+                self.hud_item = None
+            self.perf_label.pack_forget()
+    
+    def _update_perf_hud(self):
+        """刷新性能浮层和状态面板"""
+        self.hud_after_id = None
+        if not self.hud_var.get():
+            return
+        
+        stats = self.perf_metrics.snapshot()
+        def ms(value):
+            return "-" if value is None else f"{value:.1f}"
+        if self.is_playing:
+            playback = (f"目标 {1 / self._get_frame_interval():.1f} fps | "
+                        f"实际 {self._get_achieved_fps():.1f} fps | 跳帧 {self.frames_dropped}")
+        else:
+            playback = "未播放"
+        memory = 0
+        resident = 0
+        if isinstance(self.frames, FrameSequence):
+            memory = self.frames.memory_bytes()
+            resident = self.frames.resident_count()
+        hit_rate = "-" if stats['cache_hit_rate'] is None else f"{stats['cache_hit_rate'] * 100:.0f}%"
+        memory_line = f"常驻帧: {resident} | 帧内存: {self._format_file_size(memory)}"
+        self.perf_label.config(text="\n".join([
+            playback,
+            f"解码 p50/p95/p99: {ms(stats['decode_p50_ms'])}/{ms(stats['decode_p95_ms'])}/"
+            f"{ms(stats['decode_p99_ms'])} ms | 缩放 p50/p95/p99: {ms(stats['resize_p50_ms'])}/"
+            f"{ms(stats['resize_p95_ms'])}/{ms(stats['resize_p99_ms'])} ms",
+            f"缓存命中率: {hit_rate} (内存 {stats['frames_memory']}, 磁盘 {stats['frames_disk']}, "
+            f"原图 {stats['frames_decoded']})",
+            memory_line
+        ]))
+        
+        # 画布左上角的浮层只显示播放和内存信息
+        overlay = f"{playback}\n{memory_line}"
+        if self.hud_item is None:
+            self.hud_item = self.canvas.create_text(8, 8, anchor=tk.NW, fill="#00ff00",
+                                                    font=("Consolas", 9), text=overlay)
+        else:
+            self.canvas.itemconfig(self.hud_item, text=overlay)
+        self.canvas.tag_raise(self.hud_item)
+        self.hud_after_id = self.root.after(500, self._update_perf_hud)
+    
+    def export_metrics(self):
+        """把本次会话的性能数据导出为JSON或CSV文件"""
+        metrics_dir = os.path.join(CONFIG_DIR, "metrics")
+        os.makedirs(metrics_dir, exist_ok=True)
+        path = filedialog.asksaveasfilename(
+            title="导出性能数据",
+            initialdir=metrics_dir,
+            initialfile=time.strftime("metrics_%Y%m%d_%H%M%S.json"),
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json"), ("CSV", "*.csv")]
+        )
+        if not path:
+            return
+        machine = {
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'decode_workers': self.decode_workers
+        }
+        current = self.perf_metrics.snapshot()
+        current.update(frame_cache=self.frame_cache.stats(), achieved_fps=round(self._get_achieved_fps(), 2))
+        try:
+            self.perf_metrics.export(path, machine, current)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"导出性能数据失败: {e}")
     
     def open_directory(self):
         """打开当前特效文件所在目录"""
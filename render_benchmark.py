@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+画布渲染基准测试
+对比每帧 delete("all") + create_image + 更新标签 的旧渲染方式，
+与复用同一个图像项（itemconfig）并节流更新标签的新渲染方式，
+在界面线程中尽可能快地切换帧，统计持续帧率
+"""
+
+import argparse
+import time
+import tkinter as tk
+from tkinter import ttk
+from PIL import Image, ImageTk
+
+def make_frames(root, count, width, height):
+    """生成测试用的PhotoImage序列"""
+    frames = []
+    for i in range(count):
+        shade = int(255 * i / max(1, count - 1))
+        img = Image.new("RGBA", (width, height), (shade, 128, 255 - shade, 255))
+        frames.append(ImageTk.PhotoImage(img, master=root))
+    return frames
+
+def run_benchmark(root, canvas, label, frames, mode, seconds):
+    """
+    以指定方式连续切换帧，返回(帧率, 帧数)
+    mode为"recreate"时每帧删除并重新创建图像项，为"itemconfig"时复用同一个图像项
+    """
+    canvas.delete("all")
+    center = (int(canvas["width"]) // 2, int(canvas["height"]) // 2)
+    item = canvas.create_image(*center, image=frames[0])
+    state = {'index': 0, 'shown': 0, 'label_time': 0.0, 'label_text': ""}
+    end_time = time.monotonic() + seconds
+
+    def tick():
+        now = time.monotonic()
+        if now >= end_time:
+            root.quit()
+            return
+        state['index'] = (state['index'] + 1) % len(frames)
+        photo = frames[state['index']]
+        text = f"帧: {state['index'] + 1}/{len(frames)}"
+        if mode == "recreate":
+            canvas.delete("all")
+            canvas.create_image(*center, image=photo)
+            label.config(text=text)
+        else:
+            canvas.itemconfig(item, image=photo)
+            # 标签最多每16ms（约60Hz）更新一次，文字不变时不更新
+            if now - state['label_time'] >= 0.016 and text != state['label_text']:
+                state['label_time'] = now
+                state['label_text'] = text
+                label.config(text=text)
+        state['shown'] += 1
+        root.after(0, tick)
+
+    start = time.monotonic()
+    root.after(0, tick)
+    root.mainloop()
+    elapsed = time.monotonic() - start
+    return state['shown'] / elapsed, state['shown']
+
+def main():
+    parser = argparse.ArgumentParser(description="画布渲染基准测试")
+    parser.add_argument("--frames", type=int, default=120, help="测试帧数")
+    parser.add_argument("--width", type=int, default=600, help="帧宽度")
+    parser.add_argument("--height", type=int, default=400, help="帧高度")
+    parser.add_argument("--seconds", type=float, default=5.0, help="每种方式的测试时长（秒）")
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"无法创建窗口: {e}")
+        return 1
+    root.title("渲染基准测试")
+    canvas = tk.Canvas(root, bg="black", width=args.width, height=args.height, highlightthickness=0)
+    canvas.pack()
+    label = ttk.Label(root, text="")
+    label.pack()
+    frames = make_frames(root, args.frames, args.width, args.height)
+    root.update()
+
+    results = {}
+    for mode in ("recreate", "itemconfig"):
+        fps, shown = run_benchmark(root, canvas, label, frames, mode, args.seconds)
+        results[mode] = fps
+        print(f"{mode:>10}: {fps:8.1f} fps ({shown} 帧, {args.width}x{args.height})")
+    print(f"提升: {results['itemconfig'] / results['recreate']:.2f}x")
+    root.destroy()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())